@@ -10,7 +10,11 @@ from .database.models import (
     AuditLog,
 )
 from .main import FastAPIOAuthRBAC
-from .rbac.dependencies import get_current_user, requires_permission
+from .rbac.dependencies import (
+    get_current_user,
+    get_current_db_user,
+    requires_permission,
+)
 
 __all__ = [
     'FastAPIOAuthRBAC',
@@ -21,6 +25,7 @@ __all__ = [
     'UserBaseMixin',
     'AuditLog',
     'get_current_user',
+    'get_current_db_user',
     'requires_permission',
     'BaseEmailExporter',
     'AuditManager',
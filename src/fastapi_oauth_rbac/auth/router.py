@@ -12,25 +12,31 @@ from fastapi import (
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 from typing import Optional
 
 from ..auth.oauth import GoogleOAuth
 from ..core.config import settings as default_settings
+from ..core.keys import get_signing_keys
 from ..core.security import (
-    verify_password,
-    hash_password,
+    PasswordHashOverloaded,
+    verify_password_async,
+    hash_password_async,
     create_access_token,
+    encode_scopes,
     create_refresh_token,
     decode_token,
 )
 from ..database.models import User, Role
 from ..rbac.dependencies import (
     get_db,
-    get_current_user,
     get_current_user_optional,
+    check_token_revoked,
+    token_claims,
+    user_clause,
 )
+from ..rbac.context import get_auth_context
 from ..rbac.manager import RBACManager
 from ..core.audit import AuditManager
 
@@ -76,7 +82,7 @@ async def signup(
 
     user = user_model(
         email=data.email,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password_async(data.password),
         roles=[user_role] if user_role else [],
         tenant_id=data.tenant_id,
     )
@@ -103,13 +109,96 @@ async def signup(
     # 2. Handle Verification Email
     if s.VERIFY_EMAIL_ENABLED and rbac_instance:
         token = create_access_token(
-            data={'sub': user.email, 'type': 'verify_email'}, settings=s
+            data={**token_claims(user), 'type': 'verify_email'}, settings=s
         )
         await rbac_instance.email_exporter.send_verification_email(user, token)
 
     return {'message': 'User created successfully', 'email': user.email}
 
 
+async def _access_token_data(
+    request: Request, db: AsyncSession, user: User
+) -> dict:
+    """Builds the access token claims: subject, scopes and policy version."""
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    s = rbac_instance.settings if rbac_instance else default_settings
+
+    data = token_claims(user)
+    if rbac_instance:
+        # Read before resolving, so a concurrent change marks the token stale
+        data['pv'] = rbac_instance.policy_version
+        rbac = rbac_instance.get_rbac_manager(db, request)
+    else:
+        rbac = RBACManager(db)
+
+    if s.COMPACT_TOKEN_SCOPES:
+        permissions = await rbac.get_permission_set(user)
+        data.update(encode_scopes(permissions.minimal()))
+    else:
+        permissions = await rbac.get_user_permissions(user)
+        data['scopes'] = list(permissions)
+    return data
+
+
+def _client_ip(request: Request) -> Optional[str]:
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if rbac_instance and rbac_instance.client_ip_resolver:
+        return rbac_instance.client_ip_resolver(request)
+    return request.client.host if request.client else None
+
+
+async def _check_throttle(
+    request: Request, scope: str, identity: Optional[str] = None
+):
+    """Rejects the attempt with a 429 while its identity or IP is locked."""
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if not rbac_instance or not rbac_instance.throttle:
+        return
+
+    retry_after = await rbac_instance.throttle.check(
+        scope, identity, _client_ip(request)
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Too many attempts, try again later',
+            headers={'Retry-After': str(retry_after)},
+        )
+
+
+async def _record_attempt(
+    request: Request,
+    db: AsyncSession,
+    scope: str,
+    identity: Optional[str] = None,
+):
+    """
+    Counts a throttled attempt, auditing the lockouts it causes. Rejects
+    it with a 429 if concurrent attempts used up the limit since
+    `_check_throttle`.
+    """
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if not rbac_instance or not rbac_instance.throttle:
+        return
+
+    ip_address = _client_ip(request)
+    allowed, locked = await rbac_instance.throttle.hit(
+        scope, identity, ip_address
+    )
+    for key in locked:
+        audit = AuditManager(db)
+        await audit.log(
+            actor_email=identity or 'anonymous',
+            action=f'{scope.upper()}_LOCKOUT',
+            target=key,
+            ip_address=ip_address,
+            enabled=rbac_instance.settings.AUDIT_ENABLED,
+        )
+    if not allowed:
+        # Over a limit, so this raises the 429
+        await _check_throttle(request, scope, identity)
+
+
 @auth_router.post('/login')
 async def login_for_access_token(
     request: Request,
@@ -121,6 +210,11 @@ async def login_for_access_token(
     s = rbac_instance.settings if rbac_instance else default_settings
     user_model = rbac_instance.user_model if rbac_instance else User
 
+    # Rejected before any query or password hash. The attempt is counted
+    # before verifying the password so concurrent guesses can't overshoot
+    await _check_throttle(request, 'login', form_data.username)
+    await _record_attempt(request, db, 'login', form_data.username)
+
     stmt = (
         select(user_model)
         .where(user_model.email == form_data.username)
@@ -132,7 +226,9 @@ async def login_for_access_token(
     if (
         not user
         or not user.hashed_password
-        or not verify_password(form_data.password, user.hashed_password)
+        or not await verify_password_async(
+            form_data.password, user.hashed_password
+        )
     ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -140,11 +236,6 @@ async def login_for_access_token(
             headers={'WWW-Authenticate': 'Bearer'},
         )
 
-    if user.is_revoked:
-        user.is_revoked = False
-        await db.commit()
-        await db.refresh(user, ['roles'])
-
     if (
         rbac_instance
         and rbac_instance.settings.REQUIRE_VERIFIED_LOGIN
@@ -156,14 +247,13 @@ async def login_for_access_token(
             headers={'WWW-Authenticate': 'Bearer'},
         )
 
-    # Fetch permissions for scopes
-    rbac = RBACManager(db)
-    permissions = await rbac.get_user_permissions(user)
+    if rbac_instance and rbac_instance.throttle:
+        await rbac_instance.throttle.reset('login', form_data.username)
 
-    access_token = create_access_token(
-        data={'sub': user.email, 'scopes': list(permissions)}, settings=s
-    )
-    refresh_token = create_refresh_token(data={'sub': user.email}, settings=s)
+    # Fetch permissions for scopes
+    data = await _access_token_data(request, db, user)
+    access_token = create_access_token(data=data, settings=s)
+    refresh_token = create_refresh_token(data=token_claims(user), settings=s)
 
     # Set cookie for dashboard access
     response.set_cookie(
@@ -203,20 +293,47 @@ async def login_for_access_token(
 
 @auth_router.post('/logout')
 async def logout(
+    request: Request,
     response: Response,
     global_logout: bool = False,
     current_user: Optional[User] = Depends(get_current_user_optional),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Clears the access token cookie and optionally performs a global logout
-    (invalidating all sessions for this user).
+    Clears the token cookies and, with `AUTH_REVOCATION_ENABLED`, revokes
+    this session's tokens. A global logout revokes every token issued to
+    the user so far (all sessions).
     """
     response.delete_cookie(key='access_token', path='/')
+    response.delete_cookie(key='refresh_token', path='/')
+    if current_user is None:
+        return {'message': 'Logged out successfully'}
 
-    if global_logout and current_user:
-        current_user.is_revoked = True
-        await db.commit()
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if global_logout:
+        if rbac_instance:
+            await rbac_instance.revoke_sessions(
+                db, current_user.id, current_user.tenant_id
+            )
+        else:
+            # current_user may be a cached, read-only principal
+            await db.execute(
+                update(User)
+                .where(User.id == current_user.id)
+                .values(token_version=User.token_version + 1)
+            )
+            await db.commit()
+    elif rbac_instance and rbac_instance.revocations is not None:
+        s = rbac_instance.settings
+        await rbac_instance.revoke_token(db, get_auth_context(request).payload)
+        refresh = request.cookies.get('refresh_token')
+        if refresh:
+            try:
+                payload = decode_token(refresh, settings=s)
+            except Exception:
+                payload = None
+            if payload and payload.get('uid') == str(current_user.id):
+                await rbac_instance.revoke_token(db, payload)
 
     return {'message': 'Logged out successfully'}
 
@@ -247,7 +364,7 @@ async def refresh_token(
         payload = decode_token(token, settings=s)
         if payload.get('type') != 'refresh':
             raise ValueError('Invalid token type')
-        email = payload.get('sub')
+        condition = user_clause(user_model, payload)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -256,27 +373,26 @@ async def refresh_token(
 
     stmt = (
         select(user_model)
-        .where(user_model.email == email)
+        .where(condition)
         .options(selectinload(user_model.roles))
     )
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
 
-    if not user or (s.AUTH_REVOCATION_ENABLED and user.is_revoked):
+    if not user or (
+        s.AUTH_REVOCATION_ENABLED
+        and await check_token_revoked(request, db, payload, user)
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='User not found or session revoked',
         )
 
     # Fetch permissions for scopes
-    rbac = RBACManager(db)
-    permissions = await rbac.get_user_permissions(user)
-
-    new_access_token = create_access_token(
-        data={'sub': user.email, 'scopes': list(permissions)}, settings=s
-    )
+    data = await _access_token_data(request, db, user)
+    new_access_token = create_access_token(data=data, settings=s)
     new_refresh_token = create_refresh_token(
-        data={'sub': user.email}, settings=s
+        data=token_claims(user), settings=s
     )
 
     # Update cookies
@@ -304,10 +420,23 @@ async def refresh_token(
 
 @auth_router.get('/me')
 async def read_users_me(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    current_user: Optional[User] = Depends(get_current_user_optional),
     db: AsyncSession = Depends(get_db),
 ):
-    rbac = RBACManager(db)
+    # The profile needs the stored user, even in stateless mode
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Could not validate credentials',
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    rbac = (
+        rbac_instance.get_rbac_manager(db, request)
+        if rbac_instance
+        else RBACManager(db)
+    )
     permissions = await rbac.get_user_permissions(current_user)
     return {
         'email': current_user.email,
@@ -318,6 +447,20 @@ async def read_users_me(
     }
 
 
+@auth_router.get('/.well-known/jwks.json')
+async def jwks(request: Request, response: Response):
+    """
+    Public keys tokens are signed with, so other services can verify them
+    locally. Empty for HMAC (shared secret) algorithms.
+    """
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    s = rbac_instance.settings if rbac_instance else default_settings
+    response.headers['Cache-Control'] = (
+        f'public, max-age={s.JWKS_CACHE_SECONDS}'
+    )
+    return get_signing_keys(s).jwks()
+
+
 @auth_router.get('/verify')
 async def verify_email(
     request: Request, token: str, db: AsyncSession = Depends(get_db)
@@ -327,11 +470,10 @@ async def verify_email(
 
     try:
         payload = decode_token(token, settings=s)
-        email = payload.get('sub')
 
         user_model = rbac_instance.user_model if rbac_instance else User
 
-        stmt = select(user_model).where(user_model.email == email)
+        stmt = select(user_model).where(user_clause(user_model, payload))
         result = await db.execute(stmt)
         user = result.scalar_one_or_none()
         if not user:
@@ -342,6 +484,7 @@ async def verify_email(
 
         # Trigger Hook
         if rbac_instance:
+            await rbac_instance.user_changed(db, user.id, user.tenant_id)
             await rbac_instance.hooks.trigger('post_email_verify', user)
 
         return {'message': 'Email verified successfully'}
@@ -357,23 +500,26 @@ async def forgot_password(
     s = rbac_instance.settings if rbac_instance else default_settings
     user_model = rbac_instance.user_model if rbac_instance else User
 
+    # Every request may send an email, so all of them count
+    await _check_throttle(request, 'forgot_password', email)
+    await _record_attempt(request, db, 'forgot_password', email)
+
     stmt = select(user_model).where(user_model.email == email)
     result = await db.execute(stmt)
-    if not result.scalar_one_or_none():
+    user = result.scalar_one_or_none()
+    if not user:
         return {
             'message': 'If the email is registered, you will receive a reset link'
         }
 
     token = create_access_token(
-        data={'sub': email, 'type': 'reset_password'}, settings=s
+        data={**token_claims(user), 'type': 'reset_password'}, settings=s
     )
 
     if rbac_instance:
-        # Fetch user again to be sure (already done by exist check above but we need to pass it to exporter)
-        stmt = select(user_model).where(user_model.email == email)
-        res = await db.execute(stmt)
-        u = res.scalar_one()
-        await rbac_instance.email_exporter.send_password_reset_email(u, token)
+        await rbac_instance.email_exporter.send_password_reset_email(
+            user, token
+        )
 
     return {
         'message': 'If the email is registered, you will receive a reset link',
@@ -395,17 +541,15 @@ async def reset_password(
         if payload.get('type') != 'reset_password':
             raise ValueError('Invalid token type')
 
-        email = payload.get('sub')
-
         user_model = rbac_instance.user_model if rbac_instance else User
 
-        stmt = select(user_model).where(user_model.email == email)
+        stmt = select(user_model).where(user_clause(user_model, payload))
         result = await db.execute(stmt)
         user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(status_code=404, detail='User not found')
 
-        user.hashed_password = hash_password(data.new_password)
+        user.hashed_password = await hash_password_async(data.new_password)
         await db.commit()
 
         # Trigger Hook
@@ -413,6 +557,8 @@ async def reset_password(
             await rbac_instance.hooks.trigger('post_password_reset', user)
 
         return {'message': 'Password reset successfully'}
+    except PasswordHashOverloaded:
+        raise
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid or expired token')
 
@@ -472,11 +618,8 @@ async def _process_google_login(
             detail='USER_NOT_VERIFIED',
         )
 
-    rbac = RBACManager(db)
-    permissions = await rbac.get_user_permissions(user)
-    access_token = create_access_token(
-        data={'sub': user.email, 'scopes': list(permissions)}, settings=s
-    )
+    data = await _access_token_data(request, db, user)
+    access_token = create_access_token(data=data, settings=s)
 
     # Set cookie for dashboard access
     response = Response(
@@ -520,12 +663,15 @@ async def google_callback(
     rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
     s = rbac_instance.settings if rbac_instance else default_settings
 
+    await _check_throttle(request, 'google_login')
     try:
         redirect_uri = s.GOOGLE_OAUTH_REDIRECT_URI or str(
             request.url_for('google_callback')
         )
         return await _process_google_login(request, code, redirect_uri, db)
     except Exception as e:
+        await db.rollback()
+        await _record_attempt(request, db, 'google_login')
         raise HTTPException(status_code=400, detail=str(e))
 
 
@@ -538,6 +684,7 @@ async def google_exchange(
     rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
     s = rbac_instance.settings if rbac_instance else default_settings
 
+    await _check_throttle(request, 'google_login')
     try:
         # For SPA, usually the redirect_uri is the origin or configured one
         redirect_uri = data.redirect_uri or s.GOOGLE_OAUTH_REDIRECT_URI
@@ -550,4 +697,6 @@ async def google_exchange(
             request, data.code, redirect_uri, db
         )
     except Exception as e:
+        await db.rollback()
+        await _record_attempt(request, db, 'google_login')
         raise HTTPException(status_code=400, detail=str(e))
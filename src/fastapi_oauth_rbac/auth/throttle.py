@@ -0,0 +1,161 @@
+import math
+import time
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class ThrottleBackend(ABC):
+    """
+    Counts attempts per key over a sliding window. A backend shared by
+    every node (e.g. one backed by Redis) enforces limits cluster-wide;
+    the in-memory one only sees this process's attempts.
+    """
+
+    @abstractmethod
+    async def add(self, key: str) -> float:
+        """Records an attempt and returns the attempts in the window."""
+        pass
+
+    @abstractmethod
+    async def retry_after(self, key: str, limit: int) -> int:
+        """Seconds until `key` is under `limit` again (0 if it is)."""
+        pass
+
+    @abstractmethod
+    async def clear(self, key: str):
+        pass
+
+
+class InMemoryThrottleBackend(ThrottleBackend):
+    """
+    Sliding window counters kept as three numbers per key: the current
+    fixed bucket, its count and the previous bucket's count, which is
+    weighted by how much of it the window still covers. Holds at most
+    `max_keys` keys, evicting the least recently used.
+    """
+
+    def __init__(self, window: float = 900.0, max_keys: int = 100000):
+        if window <= 0:
+            raise ValueError('The throttle window must be positive')
+        self.window = window
+        self.max_keys = max_keys
+        # key -> [bucket, previous count, current count]
+        self._counters: OrderedDict[str, List[int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def _counter(self, key: str, now: float, create: bool = False):
+        bucket = int(now // self.window)
+        counter = self._counters.get(key)
+        if counter is None:
+            if not create:
+                return None
+            counter = self._counters[key] = [bucket, 0, 0]
+            while len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+
+        if counter[0] != bucket:
+            previous = counter[2] if counter[0] == bucket - 1 else 0
+            counter[:] = [bucket, previous, 0]
+            if not previous and not create:
+                # Nothing left in the window
+                del self._counters[key]
+                return None
+        return counter
+
+    def _estimate(self, counter: List[int], now: float) -> float:
+        elapsed = now / self.window - counter[0]
+        return counter[2] + counter[1] * (1 - elapsed)
+
+    async def add(self, key: str) -> float:
+        now = time.time()
+        counter = self._counter(key, now, create=True)
+        counter[2] += 1
+        return self._estimate(counter, now)
+
+    async def retry_after(self, key: str, limit: int) -> int:
+        now = time.time()
+        counter = self._counter(key, now)
+        if counter is None or self._estimate(counter, now) < limit:
+            return 0
+
+        _, previous, current = counter
+        elapsed = now / self.window - counter[0]
+        if current < limit:
+            # The previous bucket's share decays below the limit in this one
+            wait = 1 - (limit - current) / previous - elapsed
+        else:
+            # This bucket becomes the previous one, then decays
+            wait = 1 - elapsed + 1 - limit / current
+        return max(1, math.ceil(wait * self.window))
+
+    async def clear(self, key: str):
+        self._counters.pop(key, None)
+
+
+class LoginThrottle:
+    """
+    Limits attempts per identity (e.g. an email) and per client IP, per
+    `scope` (login, forgot-password...). Checked before any password is
+    hashed, so rejected attempts cost a dictionary lookup. Limits are
+    attempts per window and must be at least 1.
+    """
+
+    def __init__(
+        self,
+        backend: ThrottleBackend,
+        identity_limit: int = 10,
+        ip_limit: int = 100,
+    ):
+        if identity_limit < 1 or ip_limit < 1:
+            raise ValueError('Throttle limits must be at least 1')
+        self.backend = backend
+        self.identity_limit = identity_limit
+        self.ip_limit = ip_limit
+
+    def _keys(self, scope: str, identity: Optional[str], ip: Optional[str]):
+        keys = []
+        if identity:
+            key = f'{scope}:id:{identity.lower()}'
+            keys.append((key, self.identity_limit))
+        if ip:
+            keys.append((f'{scope}:ip:{ip}', self.ip_limit))
+        return keys
+
+    async def check(
+        self, scope: str, identity: Optional[str], ip: Optional[str]
+    ) -> int:
+        """Seconds until an attempt is allowed again (0 if it is now)."""
+        retry_after = 0
+        for key, limit in self._keys(scope, identity, ip):
+            retry_after = max(
+                retry_after, await self.backend.retry_after(key, limit)
+            )
+        return retry_after
+
+    async def hit(
+        self, scope: str, identity: Optional[str], ip: Optional[str]
+    ) -> Tuple[bool, List[str]]:
+        """
+        Records an attempt. Returns whether it was within the limits (a
+        concurrent attempt may have taken the last one since `check`) and
+        the keys it locked out.
+        """
+        allowed, locked = True, []
+        for key, limit in self._keys(scope, identity, ip):
+            count = await self.backend.add(key)
+            if count - 1 >= limit:
+                allowed = False
+            elif count >= limit:
+                locked.append(key)
+        return allowed, locked
+
+    async def reset(self, scope: str, identity: str):
+        """Forgets an identity's attempts, e.g. after a successful login."""
+        for key, _ in self._keys(scope, identity, None):
+            await self.backend.clear(key)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,8 +7,35 @@ class Settings(BaseSettings):
     DATABASE_URL: str = 'sqlite+aiosqlite:///./sql_app.db'
     JWT_SECRET_KEY: str = 'secret'
     JWT_ALGORITHM: str = 'HS256'
+    # PEM private key for RS*/ES* algorithms (JWT_SECRET_KEY is then unused)
+    JWT_PRIVATE_KEY: Optional[str] = None
+    # `kid` header of new tokens, and older public keys (kid -> PEM) still
+    # accepted while their tokens expire
+    JWT_KEY_ID: Optional[str] = None
+    JWT_VERIFICATION_KEYS: Dict[str, str] = {}
+    JWKS_CACHE_SECONDS: int = 300
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Threads hashing/verifying passwords (default: min(4, CPU count))
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    # Login/signup/reset admission control: callers allowed to wait for a
+    # hashing thread, and for how long, before getting a 503
+    PASSWORD_HASH_MAX_QUEUE: Optional[int] = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS: Optional[float] = 5.0
+    # Login/forgot-password/Google throttling over a sliding window:
+    # attempts allowed per identity (email) and per client IP (>= 1).
+    # Behind a reverse proxy, pass `client_ip_resolver` to FastAPIOAuthRBAC
+    LOGIN_THROTTLE_ENABLED: bool = False
+    LOGIN_THROTTLE_WINDOW_SECONDS: float = 900.0
+    LOGIN_THROTTLE_IDENTITY_LIMIT: int = 10
+    LOGIN_THROTTLE_IP_LIMIT: int = 100
+    # Counters kept in memory before the least recently used are evicted
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    # Reuse verified token payloads until they expire
+    TOKEN_CACHE_ENABLED: bool = False
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    # How long tokens that failed verification are rejected without parsing
+    TOKEN_CACHE_NEGATIVE_TTL_SECONDS: float = 5.0
 
     # OAuth Settings
     GOOGLE_OAUTH_CLIENT_ID: Optional[str] = None
@@ -17,6 +44,26 @@ class Settings(BaseSettings):
 
     # RBAC Settings
     AUTH_REVOCATION_ENABLED: bool = False
+    # Authorize from the signed token scopes only (no per-request DB load)
+    STATELESS_AUTH_ENABLED: bool = False
+    # Keep wildcards unexpanded in token scopes (compressed when large)
+    COMPACT_TOKEN_SCOPES: bool = False
+    # Cache the authenticated user (id, flags, role ids) across requests
+    PRINCIPAL_CACHE_ENABLED: bool = False
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000
+    POLICY_CACHE_ENABLED: bool = False
+    POLICY_CACHE_MAX_TENANTS: int = 1024
+    # Policy snapshot written by `python -m fastapi_oauth_rbac.main export-policy`
+    POLICY_SNAPSHOT_PATH: Optional[str] = None
+    # Policy shared by all workers on a host, e.g. '/dev/shm/forbac-policy'
+    POLICY_SHARED_PATH: Optional[str] = None
+    # Cross-node cache invalidation: 'database' polls a policy_version row
+    INVALIDATION_BACKEND: Literal['none', 'database'] = 'none'
+    INVALIDATION_POLL_SECONDS: float = 2.0
+    PERMISSION_RESOLUTION: Literal['iterative', 'cte', 'materialized'] = (
+        'iterative'
+    )
 
     # Default Admin (for quick start)
     ADMIN_EMAIL: str = 'admin@example.com'
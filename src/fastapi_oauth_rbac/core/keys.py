@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import json
+
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWTError
+
+from .config import Settings
+
+ASYMMETRIC_ALGORITHMS = (
+    'RS256',
+    'RS384',
+    'RS512',
+    'ES256',
+    'ES384',
+    'ES512',
+)
+
+# Members of each key type hashed by an RFC 7638 thumbprint
+_THUMBPRINT_MEMBERS = {
+    'RSA': ('e', 'kty', 'n'),
+    'EC': ('crv', 'kty', 'x', 'y'),
+}
+
+
+def key_thumbprint(key: Key) -> str:
+    """RFC 7638 SHA-256 thumbprint of a public `key`, base64url encoded."""
+    jwk_dict = key.to_dict()
+    members = _THUMBPRINT_MEMBERS[jwk_dict['kty']]
+    canonical = json.dumps(
+        {name: jwk_dict[name] for name in members},
+        separators=(',', ':'),
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(canonical.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+class SigningKeys:
+    """
+    Pre-parsed JWT keys for one configuration: the key new tokens are
+    signed with (tagged with `kid`) and every key tokens may be verified
+    with, by `kid`. Asymmetric keys without a configured `kid` are named
+    by their RFC 7638 thumbprint, so the JWKS always lists the active key.
+    Older public keys stay verifiable while tokens signed with them expire,
+    which makes key rotation seamless.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        signing_key: Key,
+        key_id: Optional[str] = None,
+        verification_keys: Optional[Dict[str, Key]] = None,
+        fingerprint: bytes = b'',
+    ):
+        self.algorithm = algorithm
+        self.signing_key = signing_key
+        self.verification_keys = dict(verification_keys or {})
+        # Tokens without `kid` (or with the current one) use the signing key
+        self.default_key = (
+            signing_key.public_key()
+            if algorithm in ASYMMETRIC_ALGORITHMS
+            else signing_key
+        )
+        if key_id is None and algorithm in ASYMMETRIC_ALGORITHMS:
+            key_id = key_thumbprint(self.default_key)
+        self.key_id = key_id
+        if key_id is not None:
+            self.verification_keys[key_id] = self.default_key
+        # Digest of all key material, for caches keyed by it
+        self.fingerprint = fingerprint
+
+    @property
+    def headers(self) -> Optional[dict]:
+        return {'kid': self.key_id} if self.key_id is not None else None
+
+    def verification_key(self, token: str) -> Key:
+        """Returns the key named by the token's `kid` header."""
+        key_id = jwt.get_unverified_header(token).get('kid')
+        if key_id is None:
+            return self.default_key
+        key = self.verification_keys.get(key_id)
+        if key is None:
+            raise JWTError('Unknown signing key')
+        return key
+
+    def jwks(self) -> dict:
+        """Public verification keys as a JWK Set (empty for HMAC)."""
+        if self.algorithm not in ASYMMETRIC_ALGORITHMS:
+            return {'keys': []}
+        keys = []
+        for key_id, key in sorted(self.verification_keys.items()):
+            entry = key.to_dict()
+            entry.update({'kid': key_id, 'use': 'sig'})
+            keys.append(entry)
+        return {'keys': keys}
+
+
+@lru_cache(maxsize=8)
+def _load_keys(
+    algorithm: str,
+    secret: str,
+    private_key: Optional[str],
+    key_id: Optional[str],
+    verification_keys: Tuple[Tuple[str, str], ...],
+) -> SigningKeys:
+    if algorithm in ASYMMETRIC_ALGORITHMS:
+        if not private_key:
+            raise ValueError(f'JWT_PRIVATE_KEY is required for {algorithm}')
+        signing_key = jwk.construct(private_key, algorithm)
+    else:
+        signing_key = jwk.construct(secret, algorithm)
+
+    material = hashlib.sha256(f'{algorithm}:{secret}:{private_key}'.encode())
+    for kid, public_key in verification_keys:
+        material.update(f':{kid}:{public_key}'.encode())
+
+    return SigningKeys(
+        algorithm,
+        signing_key,
+        key_id,
+        {
+            kid: jwk.construct(public_key, algorithm)
+            for kid, public_key in verification_keys
+        },
+        material.digest(),
+    )
+
+
+def get_signing_keys(settings: Settings) -> SigningKeys:
+    """Returns the parsed keys of `settings`; parsing happens once."""
+    return _load_keys(
+        settings.JWT_ALGORITHM,
+        settings.JWT_SECRET_KEY,
+        settings.JWT_PRIVATE_KEY,
+        settings.JWT_KEY_ID,
+        tuple(sorted(settings.JWT_VERIFICATION_KEYS.items())),
+    )
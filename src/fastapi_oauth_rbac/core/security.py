@@ -1,12 +1,28 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import time
+import uuid
+import zlib
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Iterable, Optional, Tuple, Union
 from jose import jwt
 from pwdlib import PasswordHash
 
 from .config import settings as default_settings, Settings
+from .keys import get_signing_keys
 
 password_hash = PasswordHash.recommended()
 
+# Scope lists whose JSON is at least this long are sent compressed
+SCOPES_COMPRESS_MIN_BYTES = 1024
+
 
 def hash_password(password: str) -> str:
     return password_hash.hash(password)
@@ -16,6 +32,134 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return password_hash.verify(plain_password, hashed_password)
 
 
+class PasswordHashOverloaded(Exception):
+    """The hashing queue is full or the wait exceeded its deadline."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Too many concurrent password operations')
+        self.retry_after = retry_after
+
+
+class PasswordHashPool:
+    """
+    Runs password hashing off the event loop on a dedicated, bounded thread
+    pool (argon2 releases the GIL while hashing). At most `max_workers`
+    hashes run at once; further callers wait on a semaphore, and `waiting`
+    / `running` expose the queue depth.
+
+    Admission control: when `max_queue` callers are already waiting, or a
+    caller waits longer than `queue_timeout` seconds, `PasswordHashOverloaded`
+    is raised instead, so a login storm sheds load instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        # Moving average of one hash, for Retry-After estimates
+        self._avg_seconds = 0.1
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores belong to one event loop (tests run several)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+            self._loop = loop
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='password-hash',
+            )
+        return self._executor
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog is expected to drain."""
+        backlog = (self.waiting + self.running) / self.max_workers
+        return max(1, math.ceil(backlog * self._avg_seconds))
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and (
+            self.max_queue is not None and self.waiting >= self.max_queue
+        ):
+            self.rejected += 1
+            raise PasswordHashOverloaded(self.retry_after())
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise PasswordHashOverloaded(self.retry_after()) from None
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_seconds += (elapsed - self._avg_seconds) * 0.2
+            self.running -= 1
+            self.completed += 1
+            semaphore.release()
+
+    def configure(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        """Applies new limits; the pool is rebuilt on next use if resized."""
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        max_workers = max_workers or min(4, os.cpu_count() or 1)
+        if max_workers != self.max_workers:
+            self.max_workers = max_workers
+            self._semaphore = None
+            self.shutdown()
+
+    def shutdown(self):
+        if self._executor is not None:
+            # Running hashes finish on their threads
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_pool = PasswordHashPool()
+
+
+async def hash_password_async(password: str) -> str:
+    """`hash_password` without blocking the event loop."""
+    return await password_pool.run(hash_password, password)
+
+
+async def verify_password_async(
+    plain_password: str, hashed_password: str
+) -> bool:
+    """`verify_password` without blocking the event loop."""
+    return await password_pool.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(
     data: dict,
     expires_delta: Optional[timedelta] = None,
@@ -30,8 +174,13 @@ def create_access_token(
             minutes=s.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     to_encode.update({'exp': expire})
+    to_encode.setdefault('jti', uuid.uuid4().hex)
+    keys = get_signing_keys(s)
     encoded_jwt = jwt.encode(
-        to_encode, s.JWT_SECRET_KEY, algorithm=s.JWT_ALGORITHM
+        to_encode,
+        keys.signing_key,
+        algorithm=s.JWT_ALGORITHM,
+        headers=keys.headers,
     )
     return encoded_jwt
 
@@ -50,14 +199,112 @@ def create_refresh_token(
             days=s.REFRESH_TOKEN_EXPIRE_DAYS
         )
     to_encode.update({'exp': expire, 'type': 'refresh'})
+    to_encode.setdefault('jti', uuid.uuid4().hex)
+    keys = get_signing_keys(s)
     encoded_jwt = jwt.encode(
         to_encode,
-        s.JWT_SECRET_KEY,
+        keys.signing_key,
         algorithm=s.JWT_ALGORITHM,
+        headers=keys.headers,
     )
     return encoded_jwt
 
 
+def encode_scopes(scopes: Iterable[str]) -> dict:
+    """
+    Returns the scope claims for a token: a plain `scopes` list, or `scz`
+    (zlib-compressed, base64url JSON) when the list is large.
+    """
+    scopes = sorted(scopes)
+    raw = json.dumps(scopes, separators=(',', ':')).encode()
+    if len(raw) < SCOPES_COMPRESS_MIN_BYTES:
+        return {'scopes': scopes}
+    packed = base64.urlsafe_b64encode(zlib.compress(raw, 9))
+    return {'scz': packed.rstrip(b'=').decode()}
+
+
+CachedToken = Union[dict, Exception]
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified token payloads, keyed by a digest of the token
+    and the verification key, so rotating `JWT_SECRET_KEY` (or the
+    algorithm) never serves a payload verified with the old key.
+    Payloads are kept until their `exp`; tokens that failed verification
+    are remembered for `negative_ttl` seconds and fail again without
+    being parsed.
+    """
+
+    def __init__(self, max_size: int = 10000, negative_ttl: float = 5.0):
+        self.max_size = max_size
+        self.negative_ttl = negative_ttl
+        # digest -> (expires_at, payload or the verification error)
+        self._entries: 'OrderedDict[bytes, Tuple[float, CachedToken]]' = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> Optional[CachedToken]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: bytes, value: CachedToken, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def _decode_token(token: str, s: Settings) -> dict:
+    key = get_signing_keys(s).verification_key(token)
+    payload = jwt.decode(token, key, algorithms=[s.JWT_ALGORITHM])
+    packed = payload.pop('scz', None)
+    if packed is not None:
+        packed += '=' * (-len(packed) % 4)
+        raw = zlib.decompress(base64.urlsafe_b64decode(packed))
+        payload['scopes'] = json.loads(raw)
+    return payload
+
+
 def decode_token(token: str, settings: Optional[Settings] = None) -> dict:
     s = settings or default_settings
-    return jwt.decode(token, s.JWT_SECRET_KEY, algorithms=[s.JWT_ALGORITHM])
+    if not s.TOKEN_CACHE_ENABLED:
+        return _decode_token(token, s)
+
+    key = hashlib.blake2b(
+        token.encode(),
+        key=get_signing_keys(s).fingerprint,
+        digest_size=16,
+    ).digest()
+    cached = token_cache.get(key)
+    if isinstance(cached, Exception):
+        raise cached.with_traceback(None)
+    if cached is not None:
+        return dict(cached)
+
+    try:
+        payload = _decode_token(token, s)
+    except Exception as e:
+        token_cache.set(key, e, time.time() + token_cache.negative_ttl)
+        raise
+    if isinstance(payload.get('exp'), (int, float)):
+        token_cache.set(key, payload, payload['exp'])
+    return dict(payload)
@@ -10,7 +10,7 @@ from sqlalchemy import select, func, or_, and_, distinct
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, aliased
 
-from ..core.security import hash_password
+from ..core.security import hash_password_async
 from ..core.audit import AuditManager
 from ..database.models import AuditLog, Permission, Role, User
 from ..rbac.dependencies import (
@@ -18,10 +18,15 @@ from ..rbac.dependencies import (
     get_current_user_optional,
     requires_permission,
 )
+from ..rbac.context import get_auth_context
 from ..rbac.manager import RBACManager
+from ..rbac.materialized import with_role_descendants
 
 dashboard_router = APIRouter(tags=['Dashboard'])
 
+# Permissions that toggle parts of the dashboard UI, checked in one pass
+UI_PERMISSIONS = ('roles:manage', 'dashboard.audit:read')
+
 
 @dashboard_router.get('/audit', response_class=HTMLResponse)
 async def audit_dashboard(
@@ -39,7 +44,12 @@ async def audit_dashboard(
             status_code=status.HTTP_303_SEE_OTHER,
         )
 
-    rbac = RBACManager(db)
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    rbac = (
+        rbac_instance.get_rbac_manager(db, request)
+        if rbac_instance
+        else RBACManager(db)
+    )
     if not await rbac.has_permission(current_user, 'dashboard.audit:read'):
         return templates.TemplateResponse(
             'access_denied.html.jinja',
@@ -70,8 +80,8 @@ async def audit_dashboard(
     result = await db.execute(stmt)
     logs = result.scalars().all()
 
-    # Get user permissions for UI toggles
-    user_perms = await rbac.get_user_permissions(current_user)
+    # Permissions for UI toggles
+    user_perms = await rbac.check_many(current_user, UI_PERMISSIONS)
 
     return templates.TemplateResponse(
         'audit.html.jinja',
@@ -111,7 +121,12 @@ async def dashboard_index(
         )
 
     # 2. Check if user has permission to view dashboard
-    rbac = RBACManager(db)
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    rbac = (
+        rbac_instance.get_rbac_manager(db, request)
+        if rbac_instance
+        else RBACManager(db)
+    )
     if not await rbac.has_permission(current_user, 'dashboard:read'):
         return templates.TemplateResponse(
             'access_denied.html.jinja',
@@ -121,7 +136,6 @@ async def dashboard_index(
 
     # 3. Standard Dashboard Logic
     # Fetch users with roles and permissions
-    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
     user_model = rbac_instance.user_model if rbac_instance else User
 
     # Base query for counts and filtering
@@ -179,8 +193,11 @@ async def dashboard_index(
     result = await db.execute(stmt)
     users = result.scalars().all()
 
-    # Get user permissions for UI toggles
-    user_perms = await rbac.get_user_permissions(current_user)
+    # Effective permissions per row, resolved for the whole page at once
+    users_perms = await rbac.bulk_get_user_permissions(users)
+
+    # Permissions for UI toggles
+    user_perms = await rbac.check_many(current_user, UI_PERMISSIONS)
 
     # Fetch all roles for the "Edit Roles" modal
     stmt_all_roles = select(Role).order_by(Role.id)
@@ -192,6 +209,7 @@ async def dashboard_index(
         {
             'request': request,
             'users': users,
+            'users_perms': users_perms,
             'all_roles': all_roles,
             'user_email': current_user.email,
             'user_perms': user_perms,
@@ -229,14 +247,12 @@ async def verify_user_action(
 
     user.is_verified = not user.is_verified
     await db.commit()
+    if rbac_instance:
+        await rbac_instance.user_changed(db, user.id, user.tenant_id)
 
     # Audit Log
     audit = AuditManager(db)
-    current_user = await get_current_user_optional(
-        request,
-        request.cookies.get('access_token'),
-        db,
-    )
+    current_user = get_auth_context(request).actor
     enabled = rbac_instance.settings.AUDIT_ENABLED if rbac_instance else True
     await audit.log(
         actor_email=current_user.email if current_user else 'system',
@@ -281,14 +297,12 @@ async def toggle_user_active(
 
     user.is_active = not user.is_active
     await db.commit()
+    if rbac_instance:
+        await rbac_instance.user_changed(db, user.id, user.tenant_id)
 
     # Audit Log
     audit = AuditManager(db)
-    current_user = await get_current_user_optional(
-        request,
-        request.cookies.get('access_token'),
-        db,
-    )
+    current_user = get_auth_context(request).actor
     enabled = rbac_instance.settings.AUDIT_ENABLED if rbac_instance else True
     await audit.log(
         actor_email=current_user.email if current_user else 'system',
@@ -335,7 +349,7 @@ async def create_user_action(
 
     new_user = user_model(
         email=email,
-        hashed_password=hash_password(password),
+        hashed_password=await hash_password_async(password),
         is_verified=is_verified,
         roles=[user_role] if user_role else [],
     )
@@ -345,11 +359,7 @@ async def create_user_action(
 
     # Audit Log
     audit = AuditManager(db)
-    current_user = await get_current_user_optional(
-        request,
-        request.cookies.get('access_token'),
-        db,
-    )
+    current_user = get_auth_context(request).actor
     enabled = rbac_instance.settings.AUDIT_ENABLED if rbac_instance else True
     await audit.log(
         actor_email=current_user.email if current_user else 'system',
@@ -400,14 +410,12 @@ async def update_user_roles(
     else:
         user.roles = []
     await db.commit()
+    if rbac_instance:
+        await rbac_instance.user_changed(db, user.id, user.tenant_id)
 
     # Audit Log
     audit = AuditManager(db)
-    current_user = await get_current_user_optional(
-        request,
-        request.cookies.get('access_token'),
-        db,
-    )
+    current_user = get_auth_context(request).actor
     enabled = rbac_instance.settings.AUDIT_ENABLED if rbac_instance else True
     await audit.log(
         actor_email=current_user.email if current_user else 'system',
@@ -435,7 +443,12 @@ async def roles_index(
             'login.html.jinja', {'request': request}
         )
 
-    rbac = RBACManager(db)
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    rbac = (
+        rbac_instance.get_rbac_manager(db, request)
+        if rbac_instance
+        else RBACManager(db)
+    )
     if not await rbac.has_permission(current_user, 'roles:manage'):
         return templates.TemplateResponse(
             'access_denied.html.jinja',
@@ -455,7 +468,7 @@ async def roles_index(
     result_perms = await db.execute(stmt_perms)
     all_permissions = result_perms.scalars().all()
 
-    user_perms = await rbac.get_user_permissions(current_user)
+    user_perms = await rbac.check_many(current_user, UI_PERMISSIONS)
 
     return templates.TemplateResponse(
         'roles.html.jinja',
@@ -501,6 +514,11 @@ async def create_role_action(
     )
     db.add(new_role)
     await db.commit()
+
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if rbac_instance:
+        await rbac_instance.policy_changed(db, [new_role.id])
+
     return RedirectResponse(
         url=request.url_for('roles_index'),
         status_code=status.HTTP_303_SEE_OTHER,
@@ -527,8 +545,17 @@ async def delete_role_action(
             detail='Cannot delete default roles',
         )
 
+    tenant_id = role.tenant_id
+    # Deleting detaches the child roles, so find them first: they lose
+    # what they inherited
+    role_ids = await with_role_descendants(db, {role_id})
     await db.delete(role)
     await db.commit()
+
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if rbac_instance:
+        await rbac_instance.policy_changed(db, role_ids, tenant_id)
+
     return RedirectResponse(
         url=request.url_for('roles_index'),
         status_code=status.HTTP_303_SEE_OTHER,
@@ -573,6 +600,11 @@ async def update_role_permissions(
         role.permissions = []
 
     await db.commit()
+
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if rbac_instance:
+        await rbac_instance.policy_changed(db, [role_id], role.tenant_id)
+
     return RedirectResponse(
         url=request.url_for('roles_index'),
         status_code=status.HTTP_303_SEE_OTHER,
@@ -56,6 +56,47 @@ user_roles = Table(
     ),
 )
 
+# Derived data: unexpanded effective permissions per role (ancestors and
+# permission descendants included). Only used with PERMISSION_RESOLUTION
+# 'materialized' and maintained by the library, hence no FK constraints.
+role_effective_permissions = Table(
+    'role_effective_permissions',
+    Base.metadata,
+    Column('role_id', Integer, primary_key=True),
+    Column('permission_id', Integer, primary_key=True),
+)
+
+# Cross-node cache invalidation (INVALIDATION_BACKEND 'database'): a single
+# version row polled by every node and the events it numbers.
+policy_version = Table(
+    'policy_version',
+    Base.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('version', Integer, nullable=False, default=0),
+    # Version of the latest POLICY event (stamped into tokens as `pv`)
+    Column('last_policy_event', Integer, nullable=False, default=0),
+)
+
+policy_events = Table(
+    'policy_events',
+    Base.metadata,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('kind', String(20), nullable=False),
+    Column('role_id', Integer),
+    Column('user_id', String(36)),
+    Column('tenant_id', String(100)),
+    Column('token_id', String(64)),
+)
+
+# Individually revoked tokens (by `jti`), kept until the token expires.
+# Only used with AUTH_REVOCATION_ENABLED.
+revoked_tokens = Table(
+    'revoked_tokens',
+    Base.metadata,
+    Column('jti', String(64), primary_key=True),
+    Column('expires_at', DateTime(timezone=True), nullable=False, index=True),
+)
+
 
 class Permission(Base):
     __tablename__ = 'permissions'
@@ -115,7 +156,9 @@ class UserBaseMixin:
     oauth_provider: Mapped[Optional[str]] = mapped_column(String(50))
     oauth_id: Mapped[Optional[str]] = mapped_column(String(255))
 
-    # Revocation support
+    # Revocation support: tokens stamped with an older `tv` claim are rejected
+    token_version: Mapped[int] = mapped_column(default=0)
+    # Legacy flag, no longer used since `token_version`
     is_revoked: Mapped[bool] = mapped_column(default=False)
     tenant_id: Mapped[Optional[str]] = mapped_column(String(100), index=True)
 
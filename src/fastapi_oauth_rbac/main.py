@@ -1,24 +1,106 @@
+import asyncio
 import secrets
 import string
 
-from typing import Type, Optional, AsyncGenerator, List, Set
+from datetime import datetime, timezone
+from typing import (
+    Type,
+    Optional,
+    AsyncGenerator,
+    Callable,
+    Iterable,
+    List,
+    Set,
+)
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, APIRouter, Depends
+from fastapi import FastAPI, APIRouter, Depends, Request
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     create_async_engine,
     async_sessionmaker,
 )
-from sqlalchemy import select
+from sqlalchemy import (
+    delete,
+    exists,
+    insert,
+    inspect,
+    literal,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.orm import selectinload
 
+from .auth.throttle import (
+    InMemoryThrottleBackend,
+    LoginThrottle,
+    ThrottleBackend,
+)
 from .core.config import settings as default_settings, Settings
-from .core.security import hash_password
+from .core.keys import get_signing_keys
+from .core.security import (
+    PasswordHashOverloaded,
+    hash_password_async,
+    password_pool,
+    token_cache,
+)
 from .core.hooks import hooks
 from .core.email import BaseEmailExporter, ConsoleEmailExporter
-from .database.models import Base, User, Role, Permission
+from .database.models import Base, User, Role, Permission, revoked_tokens
 from .database.session import get_db
+from .rbac.context import get_auth_context
+from .rbac.index import PermissionIndexCache
+from .rbac.invalidation import (
+    POLICY,
+    RESET,
+    TOKEN,
+    USER,
+    DatabaseInvalidationBackend,
+    InvalidationBackend,
+    InvalidationBus,
+    InvalidationEvent,
+)
+from .rbac.manager import RBACManager
+from .rbac.materialized import refresh_role_effective_permissions
+from .rbac.policy import PolicyCache, PolicyGraph
+from .rbac.principal import PrincipalCache
+from .rbac.revocation import RevocationList
+from .rbac.shared import SharedPolicyStore
+from .rbac.snapshot import (
+    export_policy_snapshot,
+    graph_from_snapshot,
+    read_policy_snapshot,
+    write_policy_snapshot,
+)
+
+
+BASIC_PERMISSIONS = {
+    'users:read': 'Can read user information',
+    'users:write': 'Can create/update users',
+    'users:delete': 'Can delete users',
+    'users:verify': 'Can verify/deactivate users',
+    'roles:manage': 'Can manage roles and permissions',
+    'dashboard:read': 'Can view the internal dashboard',
+    'dashboard.audit:read': 'Can view system audit logs',
+}
+
+# name -> (description, permissions, parent role)
+STANDARD_ROLES = {
+    'user': ('Standard user access', [], None),
+    'user_manager': (
+        'Can manage users but not roles',
+        ['users:write', 'users:verify', 'dashboard:read'],
+        'user',
+    ),
+    'user_admin': (
+        'Can manage users and roles',
+        ['users:*', 'roles:manage'],
+        'user_manager',
+    ),
+    'admin': ('Full system access', ['*'], 'user_admin'),
+}
 
 
 class FastAPIOAuthRBAC:
@@ -28,6 +110,11 @@ class FastAPIOAuthRBAC:
         user_model: Optional[Type] = None,
         settings: Optional[Settings] = None,
         email_exporter: Optional[BaseEmailExporter] = None,
+        invalidation_backend: Optional[InvalidationBackend] = None,
+        throttle_backend: Optional[ThrottleBackend] = None,
+        client_ip_resolver: Optional[
+            Callable[[Request], Optional[str]]
+        ] = None,
     ):
         self.app = app
         self.settings = settings or default_settings
@@ -35,6 +122,83 @@ class FastAPIOAuthRBAC:
         self.registered_roles = {}  # name -> {"description": str, "permissions": List[str]}
         self.email_exporter = email_exporter or ConsoleEmailExporter()
         self.hooks = hooks
+        self.shared_policy = (
+            SharedPolicyStore(self.settings.POLICY_SHARED_PATH)
+            if self.settings.POLICY_SHARED_PATH
+            else None
+        )
+        self.policy_cache = (
+            PolicyCache(
+                max_tenants=self.settings.POLICY_CACHE_MAX_TENANTS,
+                shared=self.shared_policy,
+            )
+            if self.settings.POLICY_CACHE_ENABLED
+            or self.settings.POLICY_SNAPSHOT_PATH
+            or self.shared_policy
+            else None
+        )
+        self.permission_index = PermissionIndexCache()
+        # Parse the signing keys once, failing early on bad configuration
+        get_signing_keys(self.settings)
+        # The password hashing pool and decode_token's cache are process-wide
+        password_pool.configure(
+            self.settings.PASSWORD_HASH_WORKERS,
+            self.settings.PASSWORD_HASH_MAX_QUEUE,
+            self.settings.PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS,
+        )
+        # Shed login/signup/reset load instead of queueing without bound
+        self.app.add_exception_handler(
+            PasswordHashOverloaded, self._password_hash_overloaded
+        )
+        token_cache.max_size = self.settings.TOKEN_CACHE_MAX_SIZE
+        token_cache.negative_ttl = (
+            self.settings.TOKEN_CACHE_NEGATIVE_TTL_SECONDS
+        )
+        self.principal_cache = (
+            PrincipalCache(
+                max_size=self.settings.PRINCIPAL_CACHE_MAX_SIZE,
+                ttl=self.settings.PRINCIPAL_CACHE_TTL_SECONDS,
+            )
+            if self.settings.PRINCIPAL_CACHE_ENABLED
+            else None
+        )
+        self.revocations = (
+            RevocationList() if self.settings.AUTH_REVOCATION_ENABLED else None
+        )
+        # Pass a shared `throttle_backend` to throttle across nodes, and a
+        # `client_ip_resolver` (e.g. reading X-Forwarded-For set by a
+        # trusted proxy) when `request.client` is a proxy
+        self.client_ip_resolver = client_ip_resolver
+        self.throttle = (
+            LoginThrottle(
+                throttle_backend
+                or InMemoryThrottleBackend(
+                    self.settings.LOGIN_THROTTLE_WINDOW_SECONDS,
+                    self.settings.LOGIN_THROTTLE_MAX_KEYS,
+                ),
+                self.settings.LOGIN_THROTTLE_IDENTITY_LIMIT,
+                self.settings.LOGIN_THROTTLE_IP_LIMIT,
+            )
+            if self.settings.LOGIN_THROTTLE_ENABLED
+            else None
+        )
+        # Bumped on every policy change; stamped into tokens as `pv`
+        self._policy_version = 0
+
+        if (
+            invalidation_backend is None
+            and self.settings.INVALIDATION_BACKEND == 'database'
+        ):
+            invalidation_backend = DatabaseInvalidationBackend()
+        self.invalidation_bus = (
+            InvalidationBus(invalidation_backend)
+            if invalidation_backend is not None
+            else None
+        )
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.subscribe(self._on_invalidation)
+            self.invalidation_bus.subscribe_async(self._sync_revocations)
+            self.invalidation_bus.subscribe_async(self._sync_shared_policy)
 
         # Initialize Database Resources
         self.db_engine = create_async_engine(
@@ -72,6 +236,22 @@ class FastAPIOAuthRBAC:
                 for name, table in Base.metadata.tables.items():
                     if name == 'audit_logs' and not self.settings.AUDIT_ENABLED:
                         continue
+                    if (
+                        name == 'role_effective_permissions'
+                        and self.settings.PERMISSION_RESOLUTION
+                        != 'materialized'
+                    ):
+                        continue
+                    if (
+                        name in ('policy_version', 'policy_events')
+                        and self.settings.INVALIDATION_BACKEND != 'database'
+                    ):
+                        continue
+                    if (
+                        name == 'revoked_tokens'
+                        and not self.settings.AUTH_REVOCATION_ENABLED
+                    ):
+                        continue
                     
                     # If using a custom model, skip the library's default 'users' table definition
                     # to let the custom one (which might have more columns) take precedence.
@@ -92,19 +272,90 @@ class FastAPIOAuthRBAC:
                     if user_table is not None:
                         await conn.run_sync(user_table.create, checkfirst=True)
 
-            # 2. Setup defaults (Mandatory)
-            async with self.db_sessionmaker() as session:
-                await self.setup_defaults(session)
+                # FOURTH: Add columns introduced since the tables were created
+                await conn.run_sync(self._upgrade_user_table)
+
+            # 1.5 Join the invalidation bus before publishing any change
+            if self.invalidation_bus is not None:
+                async with self.db_sessionmaker() as session:
+                    await self.invalidation_bus.sync(session)
+            if self.revocations is not None:
+                async with self.db_sessionmaker() as session:
+                    await self.revocations.load(session, self.user_model)
+
+            # 2. Setup defaults (Mandatory), unless a snapshot shows they exist
+            snapshot_graph = None
+            if self.settings.POLICY_SNAPSHOT_PATH:
+                snapshot_graph = graph_from_snapshot(
+                    read_policy_snapshot(self.settings.POLICY_SNAPSHOT_PATH)
+                )
+            if snapshot_graph is not None and self._snapshot_has_defaults(
+                snapshot_graph
+            ):
+                self.policy_cache.use_snapshot(snapshot_graph)
+            else:
+                async with self.db_sessionmaker() as session:
+                    await self.setup_defaults(session)
+
+            poller = None
+            if self.invalidation_bus is not None:
+                poller = asyncio.create_task(
+                    self.invalidation_bus.run(
+                        self.db_sessionmaker,
+                        self.settings.INVALIDATION_POLL_SECONDS,
+                    )
+                )
 
             # 3. Call original lifespan if it exists
-            if original_lifespan:
-                async with original_lifespan(app) as state:
-                    yield state
-            else:
-                yield
+            try:
+                if original_lifespan:
+                    async with original_lifespan(app) as state:
+                        yield state
+                else:
+                    yield
+            finally:
+                if poller is not None:
+                    poller.cancel()
+                if self.shared_policy is not None:
+                    self.shared_policy.close()
 
         app.router.lifespan_context = lifespan_wrapper
 
+    def _upgrade_user_table(self, conn):
+        """
+        Adds `token_version` to a `users` table created before it existed,
+        since `create_all` never alters existing tables.
+        """
+        user_table = getattr(self.user_model, '__table__', None)
+        if user_table is None or 'token_version' not in user_table.c:
+            return
+        inspector = inspect(conn)
+        if not inspector.has_table(user_table.name, schema=user_table.schema):
+            return
+        columns = inspector.get_columns(
+            user_table.name, schema=user_table.schema
+        )
+        if any(column['name'] == 'token_version' for column in columns):
+            return
+        preparer = conn.dialect.identifier_preparer
+        column_type = user_table.c.token_version.type.compile(conn.dialect)
+        conn.execute(
+            text(
+                f'ALTER TABLE {preparer.format_table(user_table)} '
+                f'ADD COLUMN token_version {column_type} NOT NULL DEFAULT 0'
+            )
+        )
+
+    @staticmethod
+    async def _password_hash_overloaded(
+        request: Request, exc: PasswordHashOverloaded
+    ) -> JSONResponse:
+        return JSONResponse(
+            status_code=503,
+            content={'detail': str(exc)},
+            headers={'Retry-After': str(exc.retry_after)},
+        )
+
     def include_auth_router(self, prefix: str = '/auth'):
         from .auth.router import auth_router
 
@@ -119,6 +370,185 @@ class FastAPIOAuthRBAC:
         dashboard_path = path or self.settings.DASHBOARD_PATH
         self.app.include_router(dashboard_router, prefix=dashboard_path)
 
+    def get_rbac_manager(
+        self, db: AsyncSession, request: Optional[Request] = None
+    ) -> RBACManager:
+        """
+        Returns an RBACManager wired to this instance's resolution settings.
+        When `request` is given, resolved permissions are memoized on its
+        `AuthContext` and shared with every other check in that request.
+        """
+        return RBACManager(
+            db,
+            policy_cache=self.policy_cache,
+            resolution=self.settings.PERMISSION_RESOLUTION,
+            context=get_auth_context(request) if request else None,
+            permission_index=self.permission_index,
+        )
+
+    @property
+    def policy_version(self) -> int:
+        """
+        Current policy version. With an invalidation bus this is the version
+        of the latest POLICY event, shared by every node; otherwise a
+        per-process counter.
+        """
+        if self.invalidation_bus is not None:
+            return self.invalidation_bus.policy_version
+        return self._policy_version
+
+    def invalidate_policy(self, tenant_id: Optional[str] = None):
+        """
+        Drops this process' compiled policy after roles or permissions
+        change. Pass `tenant_id` when only that tenant's roles changed, so
+        other tenants keep their cached partitions. Use `policy_changed` to
+        also notify other nodes.
+        """
+        self._policy_version += 1
+        if tenant_id is None:
+            self.permission_index.invalidate()
+        if self.policy_cache is not None:
+            self.policy_cache.invalidate(tenant_id)
+
+    async def policy_changed(
+        self,
+        db: AsyncSession,
+        role_ids: Optional[Iterable[int]] = None,
+        tenant_id: Optional[str] = None,
+    ):
+        """
+        Call after committing changes to roles, their permissions or their
+        hierarchy (`role_ids=None` means any role may have changed; pass the
+        roles' `tenant_id` when they all belong to one tenant).
+        Maintains the materialized effective permissions, when enabled, and
+        invalidates the in-memory policy.
+        """
+        if self.settings.PERMISSION_RESOLUTION == 'materialized':
+            await refresh_role_effective_permissions(db, role_ids)
+            await db.commit()
+
+        events = [
+            InvalidationEvent(POLICY, role_id=role_id, tenant_id=tenant_id)
+            for role_id in (role_ids if role_ids is not None else [None])
+        ]
+        await self._publish(db, events)
+
+    async def user_changed(
+        self, db: AsyncSession, user_id, tenant_id: Optional[str] = None
+    ):
+        """
+        Call after committing changes to a user's roles, status or sessions
+        so every node evicts what it cached about that user.
+        """
+        event = InvalidationEvent(
+            USER, user_id=str(user_id), tenant_id=tenant_id
+        )
+        await self._publish(db, [event])
+
+    async def revoke_sessions(
+        self, db: AsyncSession, user_id, tenant_id: Optional[str] = None
+    ):
+        """
+        Revokes every token issued so far to the user (global logout) by
+        bumping its `token_version` epoch. New logins are not affected.
+        """
+        user_model = self.user_model
+        await db.execute(
+            update(user_model)
+            .where(user_model.id == user_id)
+            .values(token_version=user_model.token_version + 1)
+        )
+        await db.commit()
+        await self.user_changed(db, user_id, tenant_id)
+
+    async def revoke_token(self, db: AsyncSession, payload: dict):
+        """Revokes the single token `payload` was decoded from (by `jti`)."""
+        jti = payload.get('jti')
+        if jti is None or self.revocations is None:
+            return
+        now = datetime.now(timezone.utc)
+        await db.execute(
+            delete(revoked_tokens).where(revoked_tokens.c.expires_at <= now)
+        )
+        # Revoking an already revoked token (e.g. logging out twice with
+        # the same refresh token) inserts nothing
+        expires_at = datetime.fromtimestamp(payload['exp'], timezone.utc)
+        await db.execute(
+            insert(revoked_tokens).from_select(
+                ['jti', 'expires_at'],
+                select(
+                    literal(jti, revoked_tokens.c.jti.type),
+                    literal(expires_at, revoked_tokens.c.expires_at.type),
+                ).where(~exists().where(revoked_tokens.c.jti == jti)),
+            )
+        )
+        await db.commit()
+        await self._publish(db, [InvalidationEvent(TOKEN, token_id=jti)])
+
+    async def _publish(self, db: AsyncSession, events: List[InvalidationEvent]):
+        if self.invalidation_bus is None:
+            for event in events:
+                self._on_invalidation(event)
+            await self._sync_revocations(db, events)
+            await self._sync_shared_policy(db, events)
+            return
+        for event in events:
+            await self.invalidation_bus.publish(db, event)
+
+    def _on_invalidation(self, event: InvalidationEvent):
+        """Evicts what `event` invalidates from this process' caches."""
+        if event.kind == POLICY:
+            self.invalidate_policy(event.tenant_id)
+        elif event.kind == RESET:
+            self.invalidate_policy()
+
+        if self.principal_cache is not None:
+            if event.kind == USER:
+                self.principal_cache.invalidate_user(event.user_id)
+            elif event.kind in (POLICY, RESET):
+                # Cached principals hold role names and ids
+                self.principal_cache.invalidate()
+
+    async def _sync_shared_policy(
+        self, db: AsyncSession, events: List[InvalidationEvent]
+    ):
+        """
+        Republishes this host's shared policy after a policy change, made
+        here or on another node: workers read the shared generation before
+        their own (invalidated) cache. Publishing an unchanged policy is a
+        no-op, so every worker on the host may do it.
+        """
+        if self.shared_policy is None:
+            return
+        if any(event.kind in (POLICY, RESET) for event in events):
+            await self.shared_policy.publish(db)
+
+    async def _sync_revocations(
+        self, db: AsyncSession, events: List[InvalidationEvent]
+    ):
+        """Brings the in-memory revocation list up to date with `events`."""
+        if self.revocations is None:
+            return
+        if any(event.kind == RESET for event in events):
+            await self.revocations.load(db, self.user_model)
+            return
+        await self.revocations.refresh(
+            db,
+            self.user_model,
+            user_ids={e.user_id for e in events if e.kind == USER},
+            token_ids={e.token_id for e in events if e.kind == TOKEN},
+        )
+
+    async def export_policy_snapshot(self, path: str) -> str:
+        """
+        Writes the current roles, permissions and hierarchy to `path`, for
+        workers started with `POLICY_SNAPSHOT_PATH`. Returns its version hash.
+        """
+        async with self.db_sessionmaker() as session:
+            snapshot = await export_policy_snapshot(session)
+        write_policy_snapshot(snapshot, path)
+        return snapshot['version']
+
     def add_role(self, name: str, description: str, permissions: List[str]):
         """Registers a role to be created during setup."""
         self.registered_roles[name] = {
@@ -150,48 +580,21 @@ class FastAPIOAuthRBAC:
                     to_check.extend(curr.dependencies)
         return discovered
 
-    async def setup_defaults(self, db: AsyncSession):
-        """Creates standard roles, permissions, and initial admin user with bulk queries."""
-        # 1. Collect all required permissions
-        basic_perms = {
-            'users:read': 'Can read user information',
-            'users:write': 'Can create/update users',
-            'users:delete': 'Can delete users',
-            'users:verify': 'Can verify/deactivate users',
-            'roles:manage': 'Can manage roles and permissions',
-            'dashboard:read': 'Can view the internal dashboard',
-            'dashboard.audit:read': 'Can view system audit logs',
-        }
-
+    def _default_permission_names(self) -> Set[str]:
+        """Names of every permission `setup_defaults` ensures exists."""
         # Discover permissions from routes
         discovered_perms = self._discover_route_permissions()
 
-        # 1. Define Standard Roles
-        standard_roles = {
-            'user': ('Standard user access', [], None),
-            'user_manager': (
-                'Can manage users but not roles',
-                ['users:write', 'users:verify', 'dashboard:read'],
-                'user',
-            ),
-            'user_admin': (
-                'Can manage users and roles',
-                ['users:*', 'roles:manage'],
-                'user_manager',
-            ),
-            'admin': ('Full system access', ['*'], 'user_admin'),
-        }
-
         # Permissions from registered and standard roles
         extra_perms = set()
         for role_info in self.registered_roles.values():
             extra_perms.update(role_info['permissions'])
-        for _, perms, _ in standard_roles.values():
+        for _, perms, _ in STANDARD_ROLES.values():
             extra_perms.update(perms)
 
-        # 1.5 Ensure wildcards for all discovered prefixes and global wildcard
+        # Ensure wildcards for all discovered prefixes and global wildcard
         all_base_perms = (
-            set(basic_perms.keys()) | discovered_perms | extra_perms
+            set(BASIC_PERMISSIONS.keys()) | discovered_perms | extra_perms
         )
 
         wildcard_perms = {'*'}  # Always allow global wildcard
@@ -200,7 +603,52 @@ class FastAPIOAuthRBAC:
                 prefix = perm.split(':')[0]
                 wildcard_perms.add(f'{prefix}:*')
 
-        all_perm_names = all_base_perms | wildcard_perms
+        return all_base_perms | wildcard_perms
+
+    def _default_roles(self) -> dict:
+        """Standard and registered roles: name -> (description, permissions, parent)."""
+        all_roles_to_setup = STANDARD_ROLES.copy()
+        for name, info in self.registered_roles.items():
+            all_roles_to_setup[name] = (
+                info['description'],
+                info['permissions'],
+                info.get('parent_role'),
+            )
+        return all_roles_to_setup
+
+    def _snapshot_has_defaults(self, graph: PolicyGraph) -> bool:
+        """Whether `graph` already holds everything `setup_defaults` would create."""
+        perm_names = set(graph.permission_names.values())
+        if not self._default_permission_names() <= perm_names:
+            return False
+
+        role_ids = {
+            name: role_id
+            for role_id, name in graph.role_names.items()
+            if graph.role_tenants[role_id] is None
+        }
+        for name, (_, perms, parent_name) in self._default_roles().items():
+            role_id = role_ids.get(name)
+            if role_id is None:
+                return False
+            granted = {
+                graph.permission_names[p]
+                for p in graph.role_permissions.get(role_id, ())
+            }
+            if granted != set(perms):
+                return False
+            if parent_name and graph.role_parents[role_id] != role_ids.get(
+                parent_name
+            ):
+                return False
+        return True
+
+    async def setup_defaults(self, db: AsyncSession):
+        """Creates standard roles, permissions, and initial admin user with bulk queries."""
+        # 1. Collect all required permissions
+        basic_perms = BASIC_PERMISSIONS
+        standard_roles = STANDARD_ROLES
+        all_perm_names = self._default_permission_names()
 
         # 2. Bulk fetch existing permissions
         stmt = select(Permission).where(Permission.name.in_(all_perm_names))
@@ -229,13 +677,7 @@ class FastAPIOAuthRBAC:
                 existing_perms[p.name] = p
 
         # 5. Handle Roles (Registered + Standard)
-        all_roles_to_setup = standard_roles.copy()
-        for name, info in self.registered_roles.items():
-            all_roles_to_setup[name] = (
-                info['description'],
-                info['permissions'],
-                info.get('parent_role'),
-            )
+        all_roles_to_setup = self._default_roles()
 
         # Bulk fetch existing roles
         stmt = (
@@ -304,7 +746,7 @@ class FastAPIOAuthRBAC:
 
             admin_user = self.user_model(
                 email=admin_email,
-                hashed_password=hash_password(admin_password),
+                hashed_password=await hash_password_async(admin_password),
                 is_verified=True,
                 roles=[admin_role] if admin_role else [],
                 **self.settings.ADMIN_EXTRA_DATA,
@@ -312,6 +754,7 @@ class FastAPIOAuthRBAC:
             db.add(admin_user)
 
         await db.commit()
+        await self.policy_changed(db)
 
     async def set_user_password(self, email: str, password: str):
         """Helper to update a user's password directly."""
@@ -325,7 +768,7 @@ class FastAPIOAuthRBAC:
                 print(f'User {email} not found.')
                 return False
 
-            user.hashed_password = hash_password(password)
+            user.hashed_password = await hash_password_async(password)
             await session.commit()
             print(f'Successfully updated password for {email}.')
             return True
@@ -348,6 +791,12 @@ if __name__ == '__main__':
         pwd_parser.add_argument('email', help='Email of the user')
         pwd_parser.add_argument('password', help='New password to set')
 
+        # export-policy command
+        export_parser = subparsers.add_parser(
+            'export-policy', help='Export the RBAC policy to a snapshot file'
+        )
+        export_parser.add_argument('path', help='Snapshot file to write')
+
         args = parser.parse_args()
 
         if args.command == 'set-password':
@@ -356,6 +805,12 @@ if __name__ == '__main__':
 
             auth = FastAPIOAuthRBAC(FastAPI())
             await auth.set_user_password(args.email, args.password)
+        elif args.command == 'export-policy':
+            from fastapi import FastAPI
+
+            auth = FastAPIOAuthRBAC(FastAPI())
+            version = await auth.export_policy_snapshot(args.path)
+            print(f'Policy snapshot {version} written to {args.path}.')
         else:
             parser.print_help()
 
@@ -0,0 +1,66 @@
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+
+
+class AuthContext:
+    """
+    Request-scoped memo of the authentication state.
+    Holds the decoded token, the loaded user and the effective permissions
+    resolved per user, so dependencies and handlers sharing one request
+    resolve them only once.
+    """
+
+    __slots__ = (
+        'token',
+        'payload',
+        'user',
+        'user_loaded',
+        'principal',
+        'permissions',
+    )
+
+    def __init__(self):
+        self.token: Optional[str] = None
+        self.payload: Optional[dict] = None
+        self.user: Optional[Any] = None
+        self.user_loaded = False
+        self.principal: Optional[Any] = None
+        self.permissions: Dict[Any, frozenset] = {}
+
+    def set_user(self, token: str, payload: Optional[dict], user: Any):
+        self.token = token
+        self.payload = payload
+        self.user = user
+        self.user_loaded = True
+
+    def get_user(self, token: str):
+        """Returns `(hit, user)` for the user previously loaded from `token`."""
+        if self.user_loaded and self.token == token:
+            return True, self.user
+        return False, None
+
+    def set_principal(self, token: str, payload: dict, principal: Any):
+        self.token = token
+        self.payload = payload
+        self.principal = principal
+
+    @property
+    def actor(self) -> Optional[Any]:
+        """The authenticated user, or the stateless principal if no user."""
+        return self.user if self.user is not None else self.principal
+
+    def get_principal(self, token: str):
+        """Returns the stateless principal previously built from `token`."""
+        if self.token == token:
+            return self.principal
+        return None
+
+
+def get_auth_context(request: Request) -> AuthContext:
+    """Returns the `AuthContext` stored on the request, creating it if needed."""
+    context = getattr(request.state, 'auth_context', None)
+    if context is None:
+        context = AuthContext()
+        request.state.auth_context = context
+    return context
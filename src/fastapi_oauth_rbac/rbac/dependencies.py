@@ -1,3 +1,5 @@
+import uuid
+
 from typing import List, Optional, Union
 
 from fastapi import Depends, HTTPException, status, Request
@@ -10,18 +12,78 @@ from ..core.security import decode_token
 from ..core.config import settings as default_settings, Settings
 from ..database.models import User, Role, Permission
 from ..database.session import get_db
+from .context import get_auth_context
 from .manager import RBACManager
 from .logic import Requirement, And, Permission as PermissionLogic
+from .principal import Principal, UserPrincipal
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/login', auto_error=False)
 
 
+def token_claims(user) -> dict:
+    """Identity claims of a token issued to `user`."""
+    return {
+        'sub': user.email,
+        'uid': str(user.id),
+        'tv': user.token_version or 0,
+    }
+
+
+def is_token_revoked(request: Request, payload: dict, user=None) -> bool:
+    """
+    Checks a decoded token against its user's revocation epoch (`tv` below
+    the loaded `user`'s `token_version`) and the in-memory revocation list.
+    """
+    if user is not None and payload.get('tv', 0) < (user.token_version or 0):
+        return True
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    revocations = rbac_instance.revocations if rbac_instance else None
+    return revocations is not None and revocations.is_revoked(payload)
+
+
+async def check_token_revoked(
+    request: Request, db: AsyncSession, payload: dict, user=None
+) -> bool:
+    """
+    Like `is_token_revoked`, but without an invalidation bus the revocation
+    list is checked against the database: revocations made by other
+    processes only reach this one through it.
+    """
+    if is_token_revoked(request, payload, user):
+        return True
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    if (
+        rbac_instance is None
+        or rbac_instance.revocations is None
+        or rbac_instance.invalidation_bus is not None
+    ):
+        return False
+    return await rbac_instance.revocations.check(
+        db, rbac_instance.user_model, payload
+    )
+
+
+def user_clause(user_model, payload: dict):
+    """
+    Selects the user a token was issued to: by primary key from its `uid`
+    claim, or by email for tokens issued before `uid` existed.
+    """
+    uid = payload.get('uid')
+    if uid is not None:
+        return user_model.id == uuid.UUID(uid)
+    return user_model.email == payload.get('sub')
+
+
 async def get_current_user(
     request: Request,
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db),
-) -> User:
-    user = await get_current_user_optional(request, token, db)
+) -> Union[User, Principal]:
+    """
+    Returns the authenticated user, or a `Principal` built from the token
+    claims alone when `STATELESS_AUTH_ENABLED` is set.
+    """
+    user = await get_current_principal_optional(request, token, db)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -43,6 +105,12 @@ async def get_current_user_optional(
     if not token:
         return None
 
+    # Reuse the user already loaded for this token during this request
+    context = get_auth_context(request)
+    hit, user = context.get_user(token)
+    if hit:
+        return user
+
     # Get the correct user model from app state
     rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
     user_model = User
@@ -54,29 +122,137 @@ async def get_current_user_optional(
 
     try:
         payload = decode_token(token, settings=s)
-        email: str = payload.get('sub')
-        if email is None:
+        subject = payload.get('uid') or payload.get('sub')
+        if subject is None:
+            context.set_user(token, payload, None)
             return None
+        condition = user_clause(user_model, payload)
     except Exception:
+        context.set_user(token, None, None)
         return None
 
-    # Async query with eager loading of roles and permissions
-    stmt = (
-        select(user_model)
-        .where(user_model.email == email)
-        .options(
-            selectinload(user_model.roles)
-            .selectinload(Role.permissions)
-            .selectinload(Permission.children)
+    principal_cache = rbac_instance.principal_cache if rbac_instance else None
+    if principal_cache is not None:
+        # Identity, flags and role ids only; see get_current_db_user
+        user = principal_cache.get(subject)
+        if user is None:
+            version = principal_cache.version
+            user = await UserPrincipal.load(db, user_model, condition)
+            if user is not None:
+                principal_cache.set(subject, user, version)
+    else:
+        # Async query with eager loading of roles and permissions
+        stmt = (
+            select(user_model)
+            .where(condition)
+            .options(
+                selectinload(user_model.roles)
+                .selectinload(Role.permissions)
+                .selectinload(Permission.children)
+            )
         )
+        result = await db.execute(stmt)
+        user = result.scalar_one_or_none()
+
+    if (
+        user
+        and s.AUTH_REVOCATION_ENABLED
+        and await check_token_revoked(request, db, payload, user)
+    ):
+        user = None
+
+    context.set_user(token, payload, user)
+    return user
+
+
+async def get_current_db_user(
+    request: Request,
+    user: Union[User, Principal, UserPrincipal] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    """
+    Returns the authenticated user as an ORM object (with its roles), for
+    handlers that modify it. Other dependencies may return a cached
+    `UserPrincipal` or a stateless `Principal` instead.
+    """
+    if not isinstance(user, (Principal, UserPrincipal)):
+        return user
+
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    user_model = rbac_instance.user_model if rbac_instance else User
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail='Could not validate credentials',
+        headers={'WWW-Authenticate': 'Bearer'},
     )
-    result = await db.execute(stmt)
-    user = result.scalar_one_or_none()
+    try:
+        if isinstance(user, UserPrincipal):
+            condition = user_model.id == user.id
+        else:
+            condition = user_clause(user_model, user.payload)
+    except ValueError:
+        # Malformed `uid` claim
+        raise credentials_exception
+    result = await db.execute(
+        select(user_model)
+        .where(condition)
+        .options(selectinload(user_model.roles))
+    )
+    db_user = result.scalar_one_or_none()
+    if db_user is None:
+        raise credentials_exception
+    return db_user
+
 
-    if user and s.AUTH_REVOCATION_ENABLED and user.is_revoked:
+async def get_current_principal_optional(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> Optional[Union[User, Principal]]:
+    rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+    s = rbac_instance.settings if rbac_instance else default_settings
+    if not s.STATELESS_AUTH_ENABLED:
+        return await get_current_user_optional(request, token, db)
+
+    if not token:
+        token = request.cookies.get('access_token')
+
+    if not token:
         return None
 
-    return user
+    context = get_auth_context(request)
+    principal = context.get_principal(token)
+    if principal is not None:
+        return principal
+
+    try:
+        payload = decode_token(token, settings=s)
+    except Exception:
+        return None
+
+    principal = Principal.from_payload(payload)
+    if principal is None:
+        return None
+
+    # Scopes issued before the last policy change are stale: check the DB
+    policy_version = payload.get('pv')
+    if (
+        rbac_instance
+        and policy_version is not None
+        and policy_version != rbac_instance.policy_version
+    ):
+        return await get_current_user_optional(request, token, db)
+
+    if s.AUTH_REVOCATION_ENABLED:
+        if rbac_instance is None or 'uid' not in payload:
+            # No in-memory revocation list (or an older token without the
+            # claims it needs): check against the stored user
+            return await get_current_user_optional(request, token, db)
+        if await check_token_revoked(request, db, payload):
+            return None
+
+    context.set_principal(token, payload, principal)
+    return principal
 
 
 class PermissionChecker:
@@ -87,16 +263,32 @@ class PermissionChecker:
             self.requirement = And(*requirement)
         else:
             self.requirement = requirement
+        # Bitmask test over interned permission ids (None for custom requirements)
+        self.compiled = self.requirement.compile()
 
     async def __call__(
         self,
-        user: User = Depends(get_current_user),
+        request: Request,
+        user: Union[User, Principal] = Depends(get_current_user),
         db: AsyncSession = Depends(get_db),
     ):
-        rbac = RBACManager(db)
-        user_perms = await rbac.get_user_permissions(user)
+        if isinstance(user, Principal):
+            user_perms = user.permissions
+        else:
+            rbac_instance = getattr(request.app.state, 'oauth_rbac', None)
+            rbac = (
+                rbac_instance.get_rbac_manager(db, request)
+                if rbac_instance
+                else RBACManager(db, context=get_auth_context(request))
+            )
+            user_perms = await rbac.get_permission_set(user)
+
+        if self.compiled is not None:
+            allowed = self.compiled(user_perms.mask())
+        else:
+            allowed = self.requirement.evaluate(user_perms)
 
-        if not self.requirement.evaluate(user_perms):
+        if not allowed:
             detail = f'Permission denied. Required: {self.requirement}'
             if isinstance(self.requirement, PermissionLogic):
                 detail = f'Permission denied: {self.requirement.name}'
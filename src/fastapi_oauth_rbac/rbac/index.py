@@ -0,0 +1,63 @@
+from bisect import bisect_left
+from typing import Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Permission
+
+
+def has_wildcard(permissions: Iterable[str]) -> bool:
+    return any(p == '*' or p.endswith(':*') for p in permissions)
+
+
+class PermissionIndex:
+    """
+    Sorted index of permission names.
+    Answers "all names under prefix X" with two bisections, i.e. in
+    O(log n + k) instead of a linear `startswith` scan.
+    """
+
+    __slots__ = ('_names',)
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._names: List[str] = sorted(set(names))
+
+    def under_prefix(self, prefix: str) -> List[str]:
+        """Returns every name starting with `prefix:`."""
+        # ';' is the character right after ':', so it bounds the range
+        lo = bisect_left(self._names, prefix + ':')
+        hi = bisect_left(self._names, prefix + ';', lo)
+        return self._names[lo:hi]
+
+    def expand(self, permissions: Set[str]) -> Set[str]:
+        """Expands '*' and 'prefix:*' entries against the indexed names."""
+        if not has_wildcard(permissions):
+            return permissions
+
+        if '*' in permissions:
+            return set(permissions).union(self._names)
+
+        expanded_perms = set(permissions)
+        for p in permissions:
+            if p.endswith(':*'):
+                expanded_perms.update(self.under_prefix(p[:-2]))
+        return expanded_perms
+
+
+class PermissionIndexCache:
+    """Lazily loaded `PermissionIndex`, invalidated when permissions are created."""
+
+    def __init__(self):
+        self._index: Optional[PermissionIndex] = None
+
+    def invalidate(self):
+        self._index = None
+
+    async def get_index(self, db: AsyncSession) -> PermissionIndex:
+        index = self._index
+        if index is None:
+            result = await db.execute(select(Permission.name))
+            index = PermissionIndex(result.scalars().all())
+            self._index = index
+        return index
@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import policy_events, policy_version
+
+logger = logging.getLogger(__name__)
+
+# Consecutive poll failures are logged at most this often (seconds)
+POLL_ERROR_LOG_INTERVAL = 60.0
+
+# Event kinds
+POLICY = 'policy'  # roles, their permissions or hierarchy changed
+USER = 'user'  # a user's roles, status or sessions changed
+TOKEN = 'token'  # a single token (`token_id` = jti) was revoked
+RESET = 'reset'  # events were missed: drop everything
+
+
+class InvalidationEvent:
+    """
+    A change other nodes must evict from their caches.
+    `role_id`, `user_id` and `tenant_id` narrow what changed; None means
+    "any" (e.g. a POLICY event without `tenant_id` affects every tenant).
+    """
+
+    __slots__ = (
+        'kind',
+        'role_id',
+        'user_id',
+        'tenant_id',
+        'version',
+        'token_id',
+    )
+
+    def __init__(
+        self,
+        kind: str,
+        role_id: Optional[int] = None,
+        user_id: Optional[str] = None,
+        tenant_id: Optional[str] = None,
+        version: int = 0,
+        token_id: Optional[str] = None,
+    ):
+        self.kind = kind
+        self.role_id = role_id
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.version = version
+        self.token_id = token_id
+
+    def __repr__(self) -> str:
+        return (
+            f'InvalidationEvent({self.kind!r}, role_id={self.role_id!r}, '
+            f'user_id={self.user_id!r}, tenant_id={self.tenant_id!r}, '
+            f'token_id={self.token_id!r}, version={self.version})'
+        )
+
+
+Subscriber = Callable[[InvalidationEvent], None]
+# Awaited once per batch of applied events, with the polling session
+AsyncSubscriber = Callable[
+    [AsyncSession, List[InvalidationEvent]], Awaitable[None]
+]
+
+
+class InvalidationBackend(ABC):
+    async def prepare(self, db: AsyncSession):
+        """Called once at startup, before the first publish or fetch."""
+        pass
+
+    @abstractmethod
+    async def get_version(self, db: AsyncSession) -> int:
+        """Returns the version of the latest published event (0 if none)."""
+        pass
+
+    async def get_policy_version(self, db: AsyncSession) -> int:
+        """
+        Returns the version of the latest POLICY event. Backends that don't
+        track it return the latest version: tokens then look stale until
+        reissued, which is safe.
+        """
+        return await self.get_version(db)
+
+    @abstractmethod
+    async def publish(
+        self, db: AsyncSession, event: InvalidationEvent
+    ) -> int:
+        """Records `event` and returns the version assigned to it."""
+        pass
+
+    @abstractmethod
+    async def fetch(
+        self, db: AsyncSession, since: int
+    ) -> Tuple[int, List[InvalidationEvent]]:
+        """
+        Returns the current version and the retained events newer than
+        `since`, oldest first.
+        """
+        pass
+
+
+class InMemoryInvalidationBackend(InvalidationBackend):
+    """Process-local backend; share one instance between buses in tests."""
+
+    def __init__(self):
+        self.events: List[InvalidationEvent] = []
+
+    async def get_version(self, db: AsyncSession) -> int:
+        return len(self.events)
+
+    async def get_policy_version(self, db: AsyncSession) -> int:
+        for event in reversed(self.events):
+            if event.kind == POLICY:
+                return event.version
+        return 0
+
+    async def publish(
+        self, db: AsyncSession, event: InvalidationEvent
+    ) -> int:
+        event.version = len(self.events) + 1
+        self.events.append(event)
+        return event.version
+
+    async def fetch(
+        self, db: AsyncSession, since: int
+    ) -> Tuple[int, List[InvalidationEvent]]:
+        return len(self.events), self.events[since:]
+
+
+class DatabaseInvalidationBackend(InvalidationBackend):
+    """
+    Default backend: a single `policy_version` row, polled by every node,
+    plus the `policy_events` it numbers.
+    Publishers bump the row before inserting their event, so the row lock
+    orders events by commit and pollers never skip one. Only the last
+    `retention` events are kept; nodes that fell further behind get a
+    RESET event.
+    """
+
+    def __init__(self, retention: int = 1000):
+        self.retention = retention
+
+    async def prepare(self, db: AsyncSession):
+        """Creates the `policy_version` row if this is the first node."""
+        result = await db.execute(
+            select(policy_version.c.id).where(policy_version.c.id == 1)
+        )
+        if result.scalar_one_or_none() is not None:
+            return
+        try:
+            await db.execute(
+                insert(policy_version).values(
+                    id=1, version=0, last_policy_event=0
+                )
+            )
+            await db.commit()
+        except IntegrityError:
+            # Another node created it first
+            await db.rollback()
+
+    async def get_version(self, db: AsyncSession) -> int:
+        result = await db.execute(
+            select(policy_version.c.version).where(policy_version.c.id == 1)
+        )
+        return result.scalar_one_or_none() or 0
+
+    async def get_policy_version(self, db: AsyncSession) -> int:
+        result = await db.execute(
+            select(policy_version.c.last_policy_event).where(
+                policy_version.c.id == 1
+            )
+        )
+        return result.scalar_one_or_none() or 0
+
+    async def publish(
+        self, db: AsyncSession, event: InvalidationEvent
+    ) -> int:
+        values = {'version': policy_version.c.version + 1}
+        if event.kind == POLICY:
+            values['last_policy_event'] = policy_version.c.version + 1
+        # Bumping the row first serializes publishers until they commit
+        await db.execute(
+            update(policy_version)
+            .where(policy_version.c.id == 1)
+            .values(**values)
+        )
+        version = await self.get_version(db)
+
+        await db.execute(
+            insert(policy_events).values(
+                id=version,
+                kind=event.kind,
+                role_id=event.role_id,
+                user_id=event.user_id,
+                tenant_id=event.tenant_id,
+                token_id=event.token_id,
+            )
+        )
+        await db.execute(
+            delete(policy_events).where(
+                policy_events.c.id <= version - self.retention
+            )
+        )
+        await db.commit()
+        event.version = version
+        return version
+
+    async def fetch(
+        self, db: AsyncSession, since: int
+    ) -> Tuple[int, List[InvalidationEvent]]:
+        version = await self.get_version(db)
+        if version <= since:
+            return version, []
+
+        result = await db.execute(
+            select(
+                policy_events.c.id,
+                policy_events.c.kind,
+                policy_events.c.role_id,
+                policy_events.c.user_id,
+                policy_events.c.tenant_id,
+                policy_events.c.token_id,
+            )
+            .where(policy_events.c.id > since, policy_events.c.id <= version)
+            .order_by(policy_events.c.id)
+        )
+        events = [
+            InvalidationEvent(
+                kind, role_id, user_id, tenant_id, event_id, token_id
+            )
+            for (
+                event_id,
+                kind,
+                role_id,
+                user_id,
+                tenant_id,
+                token_id,
+            ) in result.all()
+        ]
+        return version, events
+
+
+class InvalidationBus:
+    """
+    Fans invalidation events out to local subscribers and, through the
+    backend, to every other node polling it.
+    """
+
+    def __init__(self, backend: InvalidationBackend):
+        self.backend = backend
+        self.version = 0
+        # Version of the latest POLICY event applied: USER and TOKEN events
+        # don't make token scopes stale
+        self.policy_version = 0
+        self._subscribers: List[Subscriber] = []
+        self._async_subscribers: List[AsyncSubscriber] = []
+
+    def subscribe(self, subscriber: Subscriber):
+        self._subscribers.append(subscriber)
+
+    def subscribe_async(self, subscriber: AsyncSubscriber):
+        """For subscribers that must query the database to apply events."""
+        self._async_subscribers.append(subscriber)
+
+    async def _dispatch(
+        self, db: AsyncSession, events: List[InvalidationEvent]
+    ):
+        for event in events:
+            for subscriber in self._subscribers:
+                subscriber(event)
+        for subscriber in self._async_subscribers:
+            await subscriber(db, events)
+
+    async def sync(self, db: AsyncSession):
+        """Starts from the backend's current version without replaying."""
+        await self.backend.prepare(db)
+        self.version = await self.backend.get_version(db)
+        self.policy_version = await self.backend.get_policy_version(db)
+
+    async def publish(self, db: AsyncSession, event: InvalidationEvent):
+        """
+        Publishes `event`, then applies it locally right away together with
+        anything else published since the last poll, keeping events in order.
+        """
+        await self.backend.publish(db, event)
+        await self.poll(db)
+
+    async def poll(self, db: AsyncSession) -> int:
+        """Applies events published elsewhere since the last poll."""
+        since = self.version
+        version, events = await self.backend.fetch(db, since)
+        if version <= since:
+            return 0
+
+        if not events or events[0].version != since + 1:
+            # Some events were pruned before we saw them
+            events = [InvalidationEvent(RESET, version=version)]
+        # Applying events is idempotent: on failure they are retried
+        await self._dispatch(db, events)
+        # Advanced only once caches were evicted, so tokens stamped with it
+        # never carry scopes resolved from the old policy
+        if events[0].kind == RESET:
+            self.policy_version = await self.backend.get_policy_version(db)
+        else:
+            self.policy_version = max(
+                [self.policy_version]
+                + [e.version for e in events if e.kind == POLICY]
+            )
+        self.version = version
+        return len(events)
+
+    async def run(
+        self, sessionmaker, interval: float, max_backoff: float = 60.0
+    ):
+        """
+        Polls forever; run it as a background task and cancel to stop.
+        Failing polls are retried with exponential backoff (up to
+        `max_backoff` seconds) and logged, at most once a minute, since
+        meanwhile this node misses evictions and revocations.
+        """
+        failures = 0
+        logged_at = None
+        while True:
+            delay = interval
+            if failures:
+                delay = min(
+                    interval * 2 ** min(failures, 16),
+                    max(interval, max_backoff),
+                )
+            await asyncio.sleep(delay)
+            try:
+                async with sessionmaker() as session:
+                    await self.poll(session)
+            except Exception:
+                # Keep polling; a transient DB error must not stop eviction
+                failures += 1
+                now = time.monotonic()
+                if (
+                    logged_at is None
+                    or now - logged_at >= POLL_ERROR_LOG_INTERVAL
+                ):
+                    logged_at = now
+                    logger.exception(
+                        'Invalidation poll failed (%d in a row); caches '
+                        'may serve stale data until it recovers',
+                        failures,
+                    )
+                continue
+            if failures:
+                logger.warning(
+                    'Invalidation polling recovered after %d failures',
+                    failures,
+                )
+                failures = 0
+                logged_at = None
@@ -1,5 +1,135 @@
 from abc import ABC, abstractmethod
-from typing import Set, Union
+from typing import (
+    AbstractSet,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+
+# A requirement compiled against a `PermissionRegistry`: mask -> allowed
+CompiledRequirement = Callable[[int], bool]
+
+
+class PermissionRegistry:
+    """
+    Interns permission names to dense integer ids so permission sets can be
+    held as int bitmaps. Ids are process-local and only ever appended.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        # prefix -> bits of every interned name under 'prefix:'
+        self._prefix_masks: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, name: str) -> int:
+        perm_id = self._ids.get(name)
+        if perm_id is None:
+            perm_id = len(self._names)
+            self._ids[name] = perm_id
+            self._names.append(name)
+            bit = 1 << perm_id
+            i = name.find(':')
+            while i != -1:
+                prefix = name[:i]
+                self._prefix_masks[prefix] = (
+                    self._prefix_masks.get(prefix, 0) | bit
+                )
+                i = name.find(':', i + 1)
+        return perm_id
+
+    def bit(self, name: str) -> int:
+        return 1 << self.intern(name)
+
+    def mask(self, permissions: 'PermissionSet') -> int:
+        """Bitmap of every interned name matched by `permissions`."""
+        if permissions.is_global:
+            return (1 << len(self._names)) - 1
+        mask = 0
+        for name in permissions:
+            perm_id = self._ids.get(name)
+            if perm_id is not None:
+                mask |= 1 << perm_id
+        for prefix in permissions.prefixes:
+            mask |= self._prefix_masks.get(prefix, 0)
+        return mask
+
+
+permission_registry = PermissionRegistry()
+
+
+class PermissionSet(frozenset):
+    """
+    Compiled set of granted permission names.
+    Exact names are hashed, 'prefix:*' wildcards are kept as a prefix set and
+    '*' as a flag, so `matches()` costs O(segments) instead of a scan over
+    every granted permission.
+    """
+
+    __slots__ = ('prefixes', 'is_global', '_mask', '_mask_size')
+
+    def __new__(cls, permissions: Iterable[str] = ()):
+        self = super().__new__(cls, permissions)
+        self.prefixes = frozenset(p[:-2] for p in self if p.endswith(':*'))
+        self.is_global = '*' in self
+        self._mask = 0
+        self._mask_size = -1
+        return self
+
+    @classmethod
+    def of(cls, permissions: AbstractSet[str]) -> 'PermissionSet':
+        """Returns `permissions` compiled, without recompiling a PermissionSet."""
+        if isinstance(permissions, cls):
+            return permissions
+        return cls(permissions)
+
+    def matches(self, name: str) -> bool:
+        if self.is_global or name in self:
+            return True
+        if self.prefixes:
+            # 'a.b:c:d' can be granted by 'a.b:*' or 'a.b:c:*'
+            i = name.find(':')
+            while i != -1:
+                if name[:i] in self.prefixes:
+                    return True
+                i = name.find(':', i + 1)
+        return False
+
+    def minimal(self) -> 'PermissionSet':
+        """Drops names already granted by a wildcard; `matches()` is unchanged."""
+        if self.is_global:
+            return PermissionSet(('*',))
+        if not self.prefixes:
+            return self
+
+        kept = []
+        for name in self:
+            base = name[:-2] if name.endswith(':*') else name
+            i = base.find(':')
+            while i != -1 and base[:i] not in self.prefixes:
+                i = base.find(':', i + 1)
+            if i == -1:
+                kept.append(name)
+        return PermissionSet(kept)
+
+    def mask(self, registry: PermissionRegistry = permission_registry) -> int:
+        """
+        Returns the bitmap of `registry` names granted by this set.
+        Cached until new names are interned into the (global) registry.
+        """
+        if registry is not permission_registry:
+            return registry.mask(self)
+        if self._mask_size != len(registry):
+            self._mask = registry.mask(self)
+            self._mask_size = len(registry)
+        return self._mask
 
 
 class Requirement(ABC):
@@ -13,30 +143,54 @@ class Requirement(ABC):
         """Return all permission names involved in this requirement."""
         pass
 
+    def compile(
+        self, registry: PermissionRegistry = permission_registry
+    ) -> Optional[CompiledRequirement]:
+        """
+        Compiles the requirement into a bitmask test over `registry` ids.
+        Returns None when it cannot be compiled (e.g. custom requirements,
+        including subclasses of the built-in ones, which may override
+        `evaluate()`), in which case callers fall back to `evaluate()`.
+        """
+        return None
+
+
+def _compile_children(
+    requirements: List[Requirement], registry: PermissionRegistry
+):
+    """Splits children into a mask of plain permissions and compiled tests."""
+    bits = 0
+    tests = []
+    for r in requirements:
+        if type(r) is Permission:
+            bits |= registry.bit(r.name)
+            continue
+        test = r.compile(registry)
+        if test is None:
+            return None
+        tests.append(test)
+    return bits, tests
+
 
 class Permission(Requirement):
     def __init__(self, name: str):
         self.name = name
 
     def evaluate(self, user_permissions: Set[str]) -> bool:
-        # Check for exact match or wildcard match
-        if self.name in user_permissions:
-            return True
-
-        if '*' in user_permissions:
-            return True
-
-        # Check for prefix:* matches
-        for up in user_permissions:
-            if up.endswith(':*'):
-                prefix = up[:-2]
-                if self.name.startswith(prefix + ':'):
-                    return True
-        return False
+        # Exact, global wildcard or prefix:* match
+        return PermissionSet.of(user_permissions).matches(self.name)
 
     def get_permission_names(self) -> Set[str]:
         return {self.name}
 
+    def compile(
+        self, registry: PermissionRegistry = permission_registry
+    ) -> Optional[CompiledRequirement]:
+        if type(self) is not Permission:
+            return None
+        bit = registry.bit(self.name)
+        return lambda mask: mask & bit != 0
+
 
 class And(Requirement):
     def __init__(self, *requirements: Union[str, Requirement]):
@@ -46,6 +200,7 @@ class And(Requirement):
         ]
 
     def evaluate(self, user_permissions: Set[str]) -> bool:
+        user_permissions = PermissionSet.of(user_permissions)
         return all(r.evaluate(user_permissions) for r in self.requirements)
 
     def get_permission_names(self) -> Set[str]:
@@ -54,6 +209,21 @@ class And(Requirement):
             names.update(r.get_permission_names())
         return names
 
+    def compile(
+        self, registry: PermissionRegistry = permission_registry
+    ) -> Optional[CompiledRequirement]:
+        if type(self) is not And:
+            return None
+        compiled = _compile_children(self.requirements, registry)
+        if compiled is None:
+            return None
+        required, tests = compiled
+        if not tests:
+            return lambda mask: mask & required == required
+        return lambda mask: mask & required == required and all(
+            test(mask) for test in tests
+        )
+
 
 class Or(Requirement):
     def __init__(self, *requirements: Union[str, Requirement]):
@@ -63,6 +233,7 @@ class Or(Requirement):
         ]
 
     def evaluate(self, user_permissions: Set[str]) -> bool:
+        user_permissions = PermissionSet.of(user_permissions)
         return any(r.evaluate(user_permissions) for r in self.requirements)
 
     def get_permission_names(self) -> Set[str]:
@@ -71,6 +242,21 @@ class Or(Requirement):
             names.update(r.get_permission_names())
         return names
 
+    def compile(
+        self, registry: PermissionRegistry = permission_registry
+    ) -> Optional[CompiledRequirement]:
+        if type(self) is not Or:
+            return None
+        compiled = _compile_children(self.requirements, registry)
+        if compiled is None:
+            return None
+        accepted, tests = compiled
+        if not tests:
+            return lambda mask: mask & accepted != 0
+        return lambda mask: mask & accepted != 0 or any(
+            test(mask) for test in tests
+        )
+
 
 class Not(Requirement):
     def __init__(self, requirement: Union[str, Requirement]):
@@ -85,3 +271,13 @@ class Not(Requirement):
 
     def get_permission_names(self) -> Set[str]:
         return self.requirement.get_permission_names()
+
+    def compile(
+        self, registry: PermissionRegistry = permission_registry
+    ) -> Optional[CompiledRequirement]:
+        if type(self) is not Not:
+            return None
+        test = self.requirement.compile(registry)
+        if test is None:
+            return None
+        return lambda mask: not test(mask)
@@ -1,30 +1,149 @@
-from typing import List, Set, Dict
+import uuid
+
+from typing import Any, Dict, Iterable, List, Set, Optional
 
 from sqlalchemy import select, or_
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
 
 from ..database.models import (
     User,
     Role,
     Permission,
+    role_effective_permissions,
     role_permissions,
+    user_roles,
 )
+from .context import AuthContext
+from .index import PermissionIndex, PermissionIndexCache, has_wildcard
+from .logic import PermissionSet
+from .policy import PolicyCache, PolicyGraph
+from .principal import Principal
+
+RESOLUTION_STRATEGIES = ('iterative', 'cte', 'materialized')
+
+
+def effective_permissions_query(
+    role_ids: Iterable[int], tenant_id: Optional[str] = None
+) -> Select:
+    """
+    Builds a single recursive query returning the names of every permission
+    granted to `role_ids`: role ancestors (respecting the tenant filter),
+    their `role_permissions` rows and all permission descendants.
+    """
+    role_tree = (
+        select(Role.id.label('role_id'))
+        .where(Role.id.in_(list(role_ids)))
+        .cte('role_tree', recursive=True)
+    )
+    role_tree = role_tree.union(
+        select(Role.parent_id).where(
+            Role.id == role_tree.c.role_id,
+            Role.parent_id.is_not(None),
+            or_(Role.tenant_id == tenant_id, Role.tenant_id.is_(None)),
+        )
+    )
+
+    perm_tree = (
+        select(role_permissions.c.permission_id.label('permission_id'))
+        .where(role_permissions.c.role_id.in_(select(role_tree.c.role_id)))
+        .cte('perm_tree', recursive=True)
+    )
+    perm_tree = perm_tree.union(
+        select(Permission.id).where(
+            Permission.parent_id == perm_tree.c.permission_id
+        )
+    )
+
+    return select(Permission.name).join(
+        perm_tree, Permission.id == perm_tree.c.permission_id
+    )
 
 
 class RBACManager:
-    def __init__(self, db: AsyncSession):
+    def __init__(
+        self,
+        db: AsyncSession,
+        policy_cache: Optional[PolicyCache] = None,
+        resolution: str = 'iterative',
+        context: Optional[AuthContext] = None,
+        permission_index: Optional[PermissionIndexCache] = None,
+    ):
+        if resolution not in RESOLUTION_STRATEGIES:
+            raise ValueError(f'Unknown resolution strategy: {resolution}')
         self.db = db
+        self.policy_cache = policy_cache
+        self.resolution = resolution
+        self.context = context
+        self.permission_index = permission_index
 
-    async def get_user_permissions(self, user: User) -> Set[str]:
+    async def get_user_permissions(
+        self, user: User, expand: bool = True
+    ) -> Set[str]:
         """
         Fetches all permissions for a user, including those inherited from roles.
-        Resolves hierarchy for both roles and permissions using iterative DB lookups.
+        Resolves hierarchy for both roles and permissions using iterative DB lookups,
+        a single recursive CTE (`resolution='cte'`), the maintained
+        `role_effective_permissions` table (`resolution='materialized'`), or from
+        the compiled policy graph when a `PolicyCache` is configured.
+        Results are memoized on the request `AuthContext` when one is given.
+
+        With `expand=False` wildcards ('*', 'prefix:*') are returned as-is,
+        which is enough for access checks and skips the expansion entirely.
         """
+        permissions = await self.get_permission_set(user)
+        if not expand:
+            return set(permissions)
+        # Expand wildcards for frontend visibility (e.g. '*' or 'users:*')
+        return set(await self._expand_wildcards(permissions))
+
+    async def get_permission_set(self, user: User) -> PermissionSet:
+        """Returns the user's unexpanded permissions compiled for matching."""
+        if isinstance(user, Principal):
+            return user.permissions
+
+        if self.context is None:
+            return PermissionSet(await self._resolve_permissions(user))
+
+        permissions = self.context.permissions.get(user.id)
+        if permissions is None:
+            permissions = PermissionSet(await self._resolve_permissions(user))
+            self.context.permissions[user.id] = permissions
+        return permissions
+
+    async def _resolve_permissions(self, user: User) -> Set[str]:
+        """Resolves the unexpanded effective permission set."""
         user_role_ids = {role.id for role in user.roles}
         if not user_role_ids:
             return set()
 
+        graph = await self._get_policy_graph(user.tenant_id, user_role_ids)
+        if graph is not None:
+            return graph.resolve_permissions(
+                user_role_ids, user.tenant_id, expand=False
+            )
+
+        if self.resolution == 'cte':
+            result = await self.db.execute(
+                effective_permissions_query(user_role_ids, user.tenant_id)
+            )
+            return set(result.scalars().all())
+
+        if self.resolution == 'materialized':
+            stmt = (
+                select(Permission.name)
+                .join(
+                    role_effective_permissions,
+                    role_effective_permissions.c.permission_id
+                    == Permission.id,
+                )
+                .where(role_effective_permissions.c.role_id.in_(user_role_ids))
+                .distinct()
+            )
+            result = await self.db.execute(stmt)
+            return set(result.scalars().all())
+
         # 1. Resolve role hierarchy (ancestors)
         final_role_ids = set(user_role_ids)
         to_process_roles = list(user_role_ids)
@@ -69,72 +188,184 @@ class RBACManager:
                     new_perm_ids.append(child.id)
             to_process_perm_ids = new_perm_ids
 
-        # 4. Expand wildcards for frontend visibility (e.g. '*' or 'users:*')
-        has_wildcard = any(p == '*' or p.endswith(':*') for p in final_perms)
-        if has_wildcard:
-            stmt_all = select(Permission.name)
-            result_all = await self.db.execute(stmt_all)
-            all_known_names = set(result_all.scalars().all())
-
-            expanded_perms = set()
-            for p in final_perms:
-                expanded_perms.add(p)
-                if p == '*':
-                    expanded_perms.update(all_known_names)
-                elif p.endswith(':*'):
-                    prefix = p[:-2]
-                    expanded_perms.update(
-                        {
-                            n
-                            for n in all_known_names
-                            if n.startswith(prefix + ':')
-                        }
-                    )
-            return expanded_perms
-
         return final_perms
 
+    async def _get_policy_graph(
+        self, tenant_id: Optional[str], role_ids: Iterable[int]
+    ) -> Optional[PolicyGraph]:
+        """
+        Returns the cached policy partition of `tenant_id`, or None when no
+        `PolicyCache` is configured or some of `role_ids` belong to another
+        tenant (those users are resolved from the DB instead).
+        """
+        if self.policy_cache is None:
+            return None
+        graph = await self.policy_cache.get_graph(self.db, tenant_id)
+        if all(role_id in graph.role_names for role_id in role_ids):
+            return graph
+        return None
+
+    async def _get_permission_index(self) -> PermissionIndex:
+        if self.policy_cache is not None:
+            graph = await self.policy_cache.get_graph(self.db)
+            return graph.permission_index
+        if self.permission_index is not None:
+            return await self.permission_index.get_index(self.db)
+
+        result = await self.db.execute(select(Permission.name))
+        return PermissionIndex(result.scalars().all())
+
+    async def _expand_wildcards(self, permissions: Set[str]) -> Set[str]:
+        if not has_wildcard(permissions):
+            return permissions
+        index = await self._get_permission_index()
+        return index.expand(permissions)
+
     async def has_permission(self, user: User, permission_name: str) -> bool:
-        user_perms = await self.get_user_permissions(user)
-        # Exact match
-        if permission_name in user_perms:
-            return True
-        # Global wildcard
-        if '*' in user_perms:
-            return True
-        # Prefix wildcard
-        for up in user_perms:
-            if up.endswith(':*'):
-                prefix = up[:-2]
-                if permission_name.startswith(prefix + ':'):
-                    return True
-        return False
+        user_perms = await self.get_permission_set(user)
+        return user_perms.matches(permission_name)
+
+    async def bulk_get_user_permissions(
+        self, users: Iterable[User], expand: bool = True
+    ) -> Dict[Any, Set[str]]:
+        """
+        Resolves effective permissions for many users at once, keyed by user id.
+        Uses a constant number of queries for the whole batch: one for the role
+        assignments plus the policy graph (cached, or the sub-graph reachable
+        from the batch's roles).
+        """
+        users = list(users)
+        if not users:
+            return {}
+
+        result = await self.db.execute(
+            select(user_roles.c.user_id, user_roles.c.role_id).where(
+                user_roles.c.user_id.in_([u.id for u in users])
+            )
+        )
+        role_ids_by_user: Dict[Any, Set[int]] = {}
+        for user_id, role_id in result.all():
+            role_ids_by_user.setdefault(user_id, set()).add(role_id)
+
+        batch_graph = None
+        index = None
+        permissions_by_user = {}
+        for user in users:
+            role_ids = role_ids_by_user.get(user.id, set())
+            graph = await self._get_policy_graph(user.tenant_id, role_ids)
+            if graph is None:
+                if batch_graph is None:
+                    all_role_ids = set()
+                    for ids in role_ids_by_user.values():
+                        all_role_ids.update(ids)
+                    batch_graph = await PolicyGraph.load_for_roles(
+                        self.db, all_role_ids
+                    )
+                graph = batch_graph
+            permissions = graph.resolve_permissions(
+                role_ids, user.tenant_id, expand=False
+            )
+            if expand and has_wildcard(permissions):
+                if index is None:
+                    index = await self._get_permission_index()
+                permissions = index.expand(permissions)
+            permissions_by_user[user.id] = permissions
+        return permissions_by_user
+
+    async def bulk_has_permission(
+        self, users: Iterable[User], permission_name: str
+    ) -> Dict[Any, bool]:
+        """Checks one permission for many users, keyed by user id."""
+        permissions_by_user = await self.bulk_get_user_permissions(
+            users, expand=False
+        )
+        return {
+            user_id: PermissionSet(permissions).matches(permission_name)
+            for user_id, permissions in permissions_by_user.items()
+        }
+
+    async def check_many(
+        self, user: User, permission_names: Iterable[str]
+    ) -> Dict[str, bool]:
+        """
+        Checks several permissions for one user, keyed by permission name.
+        The user's permissions are resolved once for all the checks.
+        """
+        user_perms = await self.get_permission_set(user)
+        return {name: user_perms.matches(name) for name in permission_names}
 
     async def has_any_permission(
         self, user: User, permission_names: List[str]
     ) -> bool:
-        for perm in permission_names:
-            if await self.has_permission(user, perm):
-                return True
-        return False
+        user_perms = await self.get_permission_set(user)
+        return any(user_perms.matches(name) for name in permission_names)
+
+    async def has_all_permissions(
+        self, user: User, permission_names: List[str]
+    ) -> bool:
+        user_perms = await self.get_permission_set(user)
+        return all(user_perms.matches(name) for name in permission_names)
+
+    async def get_user_roles(self, user: User) -> Set[str]:
+        """
+        Returns the names of the roles a user holds or inherits.
+        Uses the policy graph's role-closure index when a `PolicyCache` is
+        configured, otherwise a single recursive query over the user's ancestors.
+        """
+        if isinstance(user, Principal):
+            user_role_ids, tenant_id = await self._principal_roles(user)
+        else:
+            user_role_ids = {role.id for role in user.roles}
+            tenant_id = user.tenant_id
+        if not user_role_ids:
+            return set()
+
+        graph = await self._get_policy_graph(tenant_id, user_role_ids)
+        if graph is not None:
+            return graph.role_names_for(user_role_ids)
+
+        role_tree = (
+            select(Role.id.label('role_id'), Role.parent_id.label('parent_id'))
+            .where(Role.id.in_(user_role_ids))
+            .cte('role_tree', recursive=True)
+        )
+        role_tree = role_tree.union(
+            select(Role.id, Role.parent_id).where(
+                Role.id == role_tree.c.parent_id
+            )
+        )
+        result = await self.db.execute(
+            select(Role.name).join(role_tree, Role.id == role_tree.c.role_id)
+        )
+        return set(result.scalars().all())
+
+    async def _principal_roles(self, principal: Principal):
+        """
+        Loads the role assignments a stateless `Principal` doesn't carry,
+        by its `uid`; the tenant is that of its tenant roles, if any.
+        """
+        try:
+            user_id = uuid.UUID(principal.payload['uid'])
+        except (KeyError, ValueError):
+            # Older tokens can't be tied to a user id: no roles
+            return set(), None
+        result = await self.db.execute(
+            select(Role.id, Role.tenant_id)
+            .join(user_roles, user_roles.c.role_id == Role.id)
+            .where(user_roles.c.user_id == user_id)
+        )
+        rows = result.all()
+        tenant_id = next((t for _, t in rows if t is not None), None)
+        return {role_id for role_id, _ in rows}, tenant_id
 
     async def has_role(self, user: User, role_name: str) -> bool:
-        # Note: has_role now checks if user HAS or INHERITS a role
-        user_role_ids = {role.id for role in user.roles}
-        stmt_roles = select(Role)
-        result_roles = await self.db.execute(stmt_roles)
-        all_db_roles = result_roles.scalars().all()
+        # Note: has_role checks if user HAS or INHERITS a role
+        return role_name in await self.get_user_roles(user)
 
-        role_map: Dict[int, Role] = {r.id: r for r in all_db_roles}
-        final_role_ids = set()
-        to_process_roles = list(user_role_ids)
+    async def has_any_role(self, user: User, role_names: List[str]) -> bool:
+        user_roles = await self.get_user_roles(user)
+        return any(name in user_roles for name in role_names)
 
-        while to_process_roles:
-            role_id = to_process_roles.pop()
-            if role_id not in final_role_ids:
-                final_role_ids.add(role_id)
-                role = role_map.get(role_id)
-                if role and role.parent_id:
-                    to_process_roles.append(role.parent_id)
-
-        return any(role_map[rid].name == role_name for rid in final_role_ids)
+    async def has_all_roles(self, user: User, role_names: List[str]) -> bool:
+        user_roles = await self.get_user_roles(user)
+        return all(name in user_roles for name in role_names)
@@ -0,0 +1,87 @@
+from typing import Iterable, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Role, role_effective_permissions
+from .policy import PolicyGraph
+
+
+async def with_role_descendants(
+    db: AsyncSession, role_ids: Set[int]
+) -> Set[int]:
+    """
+    Returns `role_ids` plus every role inheriting from them. Collect these
+    before deleting a role: deletion detaches its children.
+    """
+    role_tree = (
+        select(Role.id.label('role_id'))
+        .where(Role.parent_id.in_(list(role_ids)))
+        .cte('role_descendants', recursive=True)
+    )
+    role_tree = role_tree.union(
+        select(Role.id).where(Role.parent_id == role_tree.c.role_id)
+    )
+    result = await db.execute(select(role_tree.c.role_id))
+    return role_ids | set(result.scalars().all())
+
+
+async def refresh_role_effective_permissions(
+    db: AsyncSession, role_ids: Optional[Iterable[int]] = None
+) -> Tuple[int, int]:
+    """
+    Brings `role_effective_permissions` up to date for `role_ids` and every
+    role inheriting from them (all roles when `role_ids` is None).
+    Only the delta is written: stale rows are deleted and missing rows
+    inserted. Roles that no longer exist lose their rows.
+    Returns `(inserted, deleted)`; the caller owns the transaction.
+
+    A role's ancestors are followed within the role's own tenant scope.
+    Role assignments live in `user_roles` and need no maintenance here.
+    """
+    if role_ids is None:
+        result = await db.execute(select(Role.id))
+        affected = set(result.scalars().all())
+        result = await db.execute(
+            select(role_effective_permissions.c.role_id).distinct()
+        )
+        affected.update(result.scalars().all())
+    else:
+        affected = await with_role_descendants(db, set(role_ids))
+    if not affected:
+        return 0, 0
+
+    graph = await PolicyGraph.load_for_roles(db, affected)
+    desired = set()
+    for role_id in affected:
+        if role_id not in graph.role_names:
+            continue
+        tenant_id = graph.role_tenants[role_id]
+        for perm_id in graph.resolve_permission_ids([role_id], tenant_id):
+            desired.add((role_id, perm_id))
+
+    result = await db.execute(
+        select(
+            role_effective_permissions.c.role_id,
+            role_effective_permissions.c.permission_id,
+        ).where(role_effective_permissions.c.role_id.in_(list(affected)))
+    )
+    existing = set(result.tuples().all())
+
+    stale = existing - desired
+    missing = desired - existing
+    if stale:
+        await db.execute(
+            delete(role_effective_permissions).where(
+                tuple_(
+                    role_effective_permissions.c.role_id,
+                    role_effective_permissions.c.permission_id,
+                ).in_(list(stale))
+            )
+        )
+    if missing:
+        await db.execute(
+            insert(role_effective_permissions),
+            [{'role_id': r, 'permission_id': p} for r, p in missing],
+        )
+    return len(missing), len(stale)
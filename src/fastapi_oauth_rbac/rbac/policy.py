@@ -0,0 +1,382 @@
+from collections import ChainMap, OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Role, Permission, role_permissions
+from .index import PermissionIndex
+
+
+class PolicyGraph:
+    """
+    Compiled, read-only view of the RBAC policy.
+    Holds the role -> parent graph, the role -> permission table and the
+    permission -> children tree so that resolution needs no DB round-trips.
+    Tenant partitions (`load_tenant`) layer a tenant's roles over the global
+    graph, sharing its roles and permissions instead of copying them.
+    """
+
+    __slots__ = (
+        'version',
+        'role_names',
+        'role_parents',
+        'role_tenants',
+        'role_permissions',
+        'permission_names',
+        'permission_children',
+        'permission_index',
+        '_role_closure',
+    )
+
+    def __init__(
+        self,
+        version: int,
+        role_names: Mapping[int, str],
+        role_parents: Mapping[int, Optional[int]],
+        role_tenants: Mapping[int, Optional[str]],
+        role_permissions: Mapping[int, List[int]],
+        permission_names: Mapping[int, str],
+        permission_children: Mapping[int, List[int]],
+        permission_index: Optional[PermissionIndex] = None,
+    ):
+        self.version = version
+        self.role_names = role_names
+        self.role_parents = role_parents
+        self.role_tenants = role_tenants
+        self.role_permissions = role_permissions
+        self.permission_names = permission_names
+        self.permission_children = permission_children
+        if permission_index is None:
+            permission_index = PermissionIndex(permission_names.values())
+        self.permission_index = permission_index
+        self._role_closure: Dict[int, FrozenSet[int]] = {}
+
+    @classmethod
+    async def load(
+        cls, db: AsyncSession, version: int = 0, global_only: bool = False
+    ) -> 'PolicyGraph':
+        """
+        Builds the graph with one query per table.
+        With `global_only`, roles belonging to a tenant are left out.
+        """
+        stmt = select(Role.id, Role.name, Role.parent_id, Role.tenant_id)
+        if global_only:
+            stmt = stmt.where(Role.tenant_id.is_(None))
+        result = await db.execute(stmt)
+        role_names = {}
+        role_parents = {}
+        role_tenants = {}
+        for role_id, name, parent_id, tenant_id in result.all():
+            role_names[role_id] = name
+            role_parents[role_id] = parent_id
+            role_tenants[role_id] = tenant_id
+
+        result = await db.execute(
+            select(Permission.id, Permission.name, Permission.parent_id)
+        )
+        permission_names = {}
+        permission_children: Dict[int, List[int]] = {}
+        for perm_id, name, parent_id in result.all():
+            permission_names[perm_id] = name
+            if parent_id is not None:
+                permission_children.setdefault(parent_id, []).append(perm_id)
+
+        stmt = select(
+            role_permissions.c.role_id, role_permissions.c.permission_id
+        )
+        if global_only:
+            stmt = stmt.join(Role, Role.id == role_permissions.c.role_id).where(
+                Role.tenant_id.is_(None)
+            )
+        result = await db.execute(stmt)
+        role_perms: Dict[int, List[int]] = {}
+        for role_id, perm_id in result.all():
+            role_perms.setdefault(role_id, []).append(perm_id)
+
+        return cls(
+            version,
+            role_names,
+            role_parents,
+            role_tenants,
+            role_perms,
+            permission_names,
+            permission_children,
+        )
+
+    @classmethod
+    async def load_tenant(
+        cls, db: AsyncSession, base: 'PolicyGraph', tenant_id: str
+    ) -> 'PolicyGraph':
+        """
+        Builds the partition for `tenant_id` on top of the global graph `base`.
+        Only the tenant's own roles are loaded (two queries); lookups of global
+        roles, permissions and their closures fall through to `base`.
+        """
+        result = await db.execute(
+            select(Role.id, Role.name, Role.parent_id).where(
+                Role.tenant_id == tenant_id
+            )
+        )
+        role_names = {}
+        role_parents = {}
+        for role_id, name, parent_id in result.all():
+            role_names[role_id] = name
+            role_parents[role_id] = parent_id
+
+        result = await db.execute(
+            select(role_permissions.c.role_id, role_permissions.c.permission_id)
+            .join(Role, Role.id == role_permissions.c.role_id)
+            .where(Role.tenant_id == tenant_id)
+        )
+        role_perms: Dict[int, List[int]] = {}
+        for role_id, perm_id in result.all():
+            role_perms.setdefault(role_id, []).append(perm_id)
+
+        graph = cls(
+            base.version,
+            ChainMap(role_names, base.role_names),
+            ChainMap(role_parents, base.role_parents),
+            ChainMap(dict.fromkeys(role_names, tenant_id), base.role_tenants),
+            ChainMap(role_perms, base.role_permissions),
+            base.permission_names,
+            base.permission_children,
+            permission_index=base.permission_index,
+        )
+        # Closures of global roles only involve global roles: reuse them
+        graph._role_closure = ChainMap({}, base._role_closure)
+        return graph
+
+    @classmethod
+    async def load_for_roles(
+        cls, db: AsyncSession, role_ids: Iterable[int]
+    ) -> 'PolicyGraph':
+        """
+        Builds the sub-graph reachable from `role_ids`: their ancestors, the
+        permissions granted to them and the descendants of those permissions.
+        Always three queries, however deep the hierarchies are.
+        """
+        role_tree = (
+            select(Role.id, Role.name, Role.parent_id, Role.tenant_id)
+            .where(Role.id.in_(list(role_ids)))
+            .cte('role_tree', recursive=True)
+        )
+        role_tree = role_tree.union(
+            select(Role.id, Role.name, Role.parent_id, Role.tenant_id).where(
+                Role.id == role_tree.c.parent_id
+            )
+        )
+        result = await db.execute(select(role_tree))
+        role_names = {}
+        role_parents = {}
+        role_tenants = {}
+        for role_id, name, parent_id, tenant_id in result.all():
+            role_names[role_id] = name
+            role_parents[role_id] = parent_id
+            role_tenants[role_id] = tenant_id
+
+        result = await db.execute(
+            select(
+                role_permissions.c.role_id, role_permissions.c.permission_id
+            ).where(role_permissions.c.role_id.in_(list(role_names)))
+        )
+        role_perms: Dict[int, List[int]] = {}
+        for role_id, perm_id in result.all():
+            role_perms.setdefault(role_id, []).append(perm_id)
+
+        granted_ids = {p for perms in role_perms.values() for p in perms}
+        perm_tree = (
+            select(Permission.id, Permission.name, Permission.parent_id)
+            .where(Permission.id.in_(list(granted_ids)))
+            .cte('perm_tree', recursive=True)
+        )
+        perm_tree = perm_tree.union(
+            select(Permission.id, Permission.name, Permission.parent_id).where(
+                Permission.parent_id == perm_tree.c.id
+            )
+        )
+        result = await db.execute(select(perm_tree))
+        permission_names = {}
+        permission_children: Dict[int, List[int]] = {}
+        for perm_id, name, parent_id in result.all():
+            permission_names[perm_id] = name
+            if parent_id is not None:
+                permission_children.setdefault(parent_id, []).append(perm_id)
+
+        return cls(
+            -1,
+            role_names,
+            role_parents,
+            role_tenants,
+            role_perms,
+            permission_names,
+            permission_children,
+        )
+
+    def ancestors(
+        self, role_ids: Iterable[int], tenant_id: Optional[str] = None
+    ) -> Set[int]:
+        """
+        Returns the given roles plus every inherited ancestor.
+        A role's parent is only followed when the role is global or belongs
+        to `tenant_id`, mirroring the DB-backed resolution.
+        """
+        final_role_ids = set(role_ids)
+        to_process = list(final_role_ids)
+        while to_process:
+            role_id = to_process.pop()
+            if role_id not in self.role_parents:
+                continue
+            if self.role_tenants[role_id] not in (tenant_id, None):
+                continue
+            parent_id = self.role_parents[role_id]
+            if parent_id is not None and parent_id not in final_role_ids:
+                final_role_ids.add(parent_id)
+                to_process.append(parent_id)
+        return final_role_ids
+
+    def role_closure(self, role_id: int) -> FrozenSet[int]:
+        """
+        Returns `role_id` plus all of its ancestors, regardless of tenant.
+        Closures are computed once per role and reused for the graph's lifetime.
+        """
+        closure = self._role_closure.get(role_id)
+        if closure is not None:
+            return closure
+
+        # Walk up until a role with a known closure (or the root) is reached
+        chain = []
+        current: Optional[int] = role_id
+        inherited: FrozenSet[int] = frozenset()
+        while current is not None and current not in chain:
+            known = self._role_closure.get(current)
+            if known is not None:
+                inherited = known
+                break
+            chain.append(current)
+            current = self.role_parents.get(current)
+
+        for chain_role_id in reversed(chain):
+            inherited = inherited | {chain_role_id}
+            self._role_closure[chain_role_id] = inherited
+        return self._role_closure[role_id]
+
+    def role_names_for(self, role_ids: Iterable[int]) -> Set[str]:
+        """Returns the names of the given roles and every inherited role."""
+        names = set()
+        for role_id in role_ids:
+            names.update(
+                self.role_names[r]
+                for r in self.role_closure(role_id)
+                if r in self.role_names
+            )
+        return names
+
+    def resolve_permission_ids(
+        self, role_ids: Iterable[int], tenant_id: Optional[str] = None
+    ) -> Set[int]:
+        """Ids of every permission granted to the roles, descendants included."""
+        perm_ids = set()
+        for role_id in self.ancestors(role_ids, tenant_id):
+            perm_ids.update(self.role_permissions.get(role_id, ()))
+
+        to_process = list(perm_ids)
+        while to_process:
+            for child_id in self.permission_children.get(to_process.pop(), ()):
+                if child_id not in perm_ids:
+                    perm_ids.add(child_id)
+                    to_process.append(child_id)
+        return perm_ids
+
+    def resolve_permissions(
+        self,
+        role_ids: Iterable[int],
+        tenant_id: Optional[str] = None,
+        expand: bool = True,
+    ) -> Set[str]:
+        """Resolves the effective permission names, optionally wildcard-expanded."""
+        final_perms = {
+            self.permission_names[p]
+            for p in self.resolve_permission_ids(role_ids, tenant_id)
+        }
+        if not expand:
+            return final_perms
+        return self.permission_index.expand(final_perms)
+
+
+class PolicyCache:
+    """
+    Versioned holder for the compiled policy, partitioned per tenant.
+    The global partition (roles without a tenant, plus all permissions) is
+    shared by every tenant partition, which only holds that tenant's roles.
+    Partitions are built lazily; at most `max_tenants` tenant partitions are
+    kept, evicting the least recently used. A preloaded snapshot graph
+    (`use_snapshot`) answers for every tenant until the first invalidation,
+    and so does the latest generation of a `SharedPolicyStore`.
+    """
+
+    def __init__(self, max_tenants: int = 1024, shared=None):
+        self.max_tenants = max_tenants
+        # Optional SharedPolicyStore published by another (or this) process
+        self.shared = shared
+        self._snapshot: Optional[PolicyGraph] = None
+        self._graph: Optional[PolicyGraph] = None
+        self._tenants: 'OrderedDict[str, PolicyGraph]' = OrderedDict()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, tenant_id: Optional[str] = None):
+        """
+        Discards the partition of `tenant_id`; the next lookup rebuilds it.
+        `tenant_id=None` discards everything, since every tenant inherits
+        the global roles.
+        """
+        self._version += 1
+        self._snapshot = None
+        if tenant_id is None:
+            self._graph = None
+            self._tenants.clear()
+        else:
+            self._tenants.pop(tenant_id, None)
+
+    def use_snapshot(self, graph: PolicyGraph):
+        """Serves the full-policy `graph` without querying the database."""
+        self._snapshot = graph
+
+    async def get_graph(
+        self, db: AsyncSession, tenant_id: Optional[str] = None
+    ) -> PolicyGraph:
+        """Returns the policy as seen by `tenant_id` (global roles if None)."""
+        if self._snapshot is not None:
+            return self._snapshot
+        if self.shared is not None:
+            graph = self.shared.get_graph()
+            if graph is not None:
+                return graph
+
+        base = self._graph
+        if base is None:
+            version = self._version
+            base = await PolicyGraph.load(db, version, global_only=True)
+            # Only publish if nothing invalidated the cache while we were loading
+            if version == self._version:
+                self._graph = base
+
+        if tenant_id is None:
+            return base
+
+        graph = self._tenants.get(tenant_id)
+        if graph is not None:
+            self._tenants.move_to_end(tenant_id)
+            return graph
+
+        version = self._version
+        graph = await PolicyGraph.load_tenant(db, base, tenant_id)
+        if version == self._version and base is self._graph:
+            self._tenants[tenant_id] = graph
+            if len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+        return graph
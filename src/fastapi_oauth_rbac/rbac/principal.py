@@ -0,0 +1,208 @@
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Role, user_roles
+from .logic import PermissionSet
+
+
+class Principal:
+    """
+    Lightweight authenticated identity built from verified token claims.
+    Used instead of the ORM `User` when `STATELESS_AUTH_ENABLED` is set: its
+    permissions are the token's `scopes`, so checks need no DB access and
+    are at most `ACCESS_TOKEN_EXPIRE_MINUTES` stale.
+    """
+
+    __slots__ = ('email', 'permissions', 'payload')
+
+    is_active = True
+    tenant_id = None
+
+    def __init__(self, email: str, permissions: PermissionSet, payload: dict):
+        self.email = email
+        self.permissions = permissions
+        self.payload = payload
+
+    @property
+    def id(self) -> str:
+        """The user's id (`uid` claim), or its email for older tokens."""
+        return self.payload.get('uid', self.email)
+
+    @classmethod
+    def from_payload(cls, payload: dict) -> Optional['Principal']:
+        """Returns None for tokens that cannot carry an authorization decision."""
+        email = payload.get('sub')
+        scopes = payload.get('scopes')
+        if email is None or scopes is None or payload.get('type') == 'refresh':
+            return None
+        return cls(email, PermissionSet(scopes), payload)
+
+    def __repr__(self) -> str:
+        return f'Principal({self.email!r})'
+
+
+class RoleRef(NamedTuple):
+    id: int
+    name: str
+
+
+class UserPrincipal:
+    """
+    Immutable snapshot of an authenticated user: identity, flags and direct
+    role assignments. Loaded with a single query and cached across requests
+    when `PRINCIPAL_CACHE_ENABLED` is set; `roles` holds `RoleRef`s, so
+    `RBACManager` treats it like the ORM `User`.
+    """
+
+    __slots__ = (
+        'id',
+        'email',
+        'tenant_id',
+        'is_active',
+        'is_verified',
+        'token_version',
+        'roles',
+    )
+
+    def __init__(
+        self,
+        id: Any,
+        email: str,
+        tenant_id: Optional[str],
+        is_active: bool,
+        is_verified: bool,
+        token_version: int,
+        roles: Tuple[RoleRef, ...] = (),
+    ):
+        set_ = object.__setattr__
+        set_(self, 'id', id)
+        set_(self, 'email', email)
+        set_(self, 'tenant_id', tenant_id)
+        set_(self, 'is_active', is_active)
+        set_(self, 'is_verified', is_verified)
+        set_(self, 'token_version', token_version)
+        set_(self, 'roles', roles)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('UserPrincipal is immutable')
+
+    @property
+    def role_ids(self) -> frozenset:
+        return frozenset(role.id for role in self.roles)
+
+    @classmethod
+    async def load(
+        cls, db: AsyncSession, user_model, condition
+    ) -> Optional['UserPrincipal']:
+        """
+        Loads the user selected by `condition` (e.g. `user_model.id == id`)
+        and its role assignments in one query.
+        """
+        stmt = (
+            select(
+                user_model.id,
+                user_model.email,
+                user_model.tenant_id,
+                user_model.is_active,
+                user_model.is_verified,
+                user_model.token_version,
+                Role.id,
+                Role.name,
+            )
+            .outerjoin(user_roles, user_roles.c.user_id == user_model.id)
+            .outerjoin(Role, Role.id == user_roles.c.role_id)
+            .where(condition)
+        )
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return None
+        roles = tuple(
+            RoleRef(row[6], row[7]) for row in rows if row[6] is not None
+        )
+        return cls(*rows[0][:6], roles)
+
+    def __repr__(self) -> str:
+        return f'UserPrincipal({self.email!r})'
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of `UserPrincipal`s keyed by token subject (`uid`, or `sub`
+    for older tokens). Entries expire after `ttl` seconds and are evicted
+    early by `invalidate_user` (user changes) or `invalidate` (policy
+    changes).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        # subject -> (expires_at, principal)
+        self._entries: 'OrderedDict[str, Tuple[float, UserPrincipal]]' = (
+            OrderedDict()
+        )
+        # str(user id) -> subjects, for evictions by id
+        self._subjects: Dict[str, Set[str]] = {}
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def version(self) -> int:
+        """Bumped by every invalidation; pass it back to `set`."""
+        return self._version
+
+    def get(self, subject: str) -> Optional[UserPrincipal]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.monotonic():
+            self._remove(subject)
+            return None
+        self._entries.move_to_end(subject)
+        return principal
+
+    def set(
+        self,
+        subject: str,
+        principal: UserPrincipal,
+        version: Optional[int] = None,
+    ):
+        """
+        Caches `principal`, unless the cache was invalidated since `version`
+        was read (the principal may have been loaded before the change).
+        """
+        if version is not None and version != self._version:
+            return
+        self._remove(subject)
+        self._entries[subject] = (time.monotonic() + self.ttl, principal)
+        self._subjects.setdefault(str(principal.id), set()).add(subject)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, subject: str):
+        entry = self._entries.pop(subject, None)
+        if entry is None:
+            return
+        user_id = str(entry[1].id)
+        subjects = self._subjects.get(user_id)
+        if subjects is not None:
+            subjects.discard(subject)
+            if not subjects:
+                del self._subjects[user_id]
+
+    def invalidate_user(self, user_id: Any):
+        self._version += 1
+        for subject in list(self._subjects.get(str(user_id), ())):
+            self._remove(subject)
+
+    def invalidate(self):
+        self._version += 1
+        self._entries.clear()
+        self._subjects.clear()
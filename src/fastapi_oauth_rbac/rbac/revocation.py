@@ -0,0 +1,133 @@
+import uuid
+
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+from sqlalchemy import null, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import revoked_tokens
+
+
+def _timestamp(value: datetime) -> float:
+    # SQLite returns naive datetimes for timezone-aware columns
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationList:
+    """
+    In-memory copy of the revocation state, so checking a token needs no
+    query: per-user epochs (the `token_version` a token's `tv` claim must
+    reach) and individually revoked `jti`s until they expire.
+    Only users whose epoch was ever bumped are held. Without an
+    invalidation bus, revocations made by other processes never reach this
+    copy: use `check` to consult the database instead.
+    """
+
+    def __init__(self):
+        self._epochs: Dict[str, int] = {}
+        # jti -> expiry timestamp
+        self._tokens: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._epochs) + len(self._tokens)
+
+    def is_revoked(self, payload: dict) -> bool:
+        jti = payload.get('jti')
+        if jti is not None and jti in self._tokens:
+            return True
+        uid = payload.get('uid')
+        if uid is None:
+            return False
+        return payload.get('tv', 0) < self._epochs.get(uid, 0)
+
+    def _set_epoch(self, user_id, token_version: int):
+        if token_version:
+            self._epochs[str(user_id)] = token_version
+        else:
+            self._epochs.pop(str(user_id), None)
+
+    def _prune(self):
+        now = datetime.now(timezone.utc).timestamp()
+        expired = [jti for jti, exp in self._tokens.items() if exp <= now]
+        for jti in expired:
+            del self._tokens[jti]
+
+    async def check(
+        self, db: AsyncSession, user_model, payload: dict
+    ) -> bool:
+        """
+        Checks `payload` against the database (one query), recording what
+        it finds so this copy stays as current as the last check.
+        """
+        if self.is_revoked(payload):
+            return True
+        jti = payload.get('jti')
+        uid = payload.get('uid')
+        token_revoked = (
+            select(revoked_tokens.c.jti)
+            .where(revoked_tokens.c.jti == jti)
+            .exists()
+        )
+        epoch = (
+            select(user_model.token_version)
+            .where(user_model.id == uuid.UUID(uid))
+            .scalar_subquery()
+            if uid is not None
+            else null()
+        )
+        result = await db.execute(select(token_revoked, epoch))
+        revoked, version = result.one()
+
+        if revoked:
+            self._tokens[jti] = float(payload.get('exp', 0))
+        if version is not None:
+            self._set_epoch(uid, version)
+        return self.is_revoked(payload)
+
+    async def load(self, db: AsyncSession, user_model):
+        """Replaces the state with the database's (startup, missed events)."""
+        result = await db.execute(
+            select(user_model.id, user_model.token_version).where(
+                user_model.token_version > 0
+            )
+        )
+        epochs = {str(user_id): version for user_id, version in result.all()}
+        result = await db.execute(
+            select(revoked_tokens.c.jti, revoked_tokens.c.expires_at).where(
+                revoked_tokens.c.expires_at > datetime.now(timezone.utc)
+            )
+        )
+        self._epochs = epochs
+        self._tokens = {jti: _timestamp(exp) for jti, exp in result.all()}
+
+    async def refresh(
+        self,
+        db: AsyncSession,
+        user_model,
+        user_ids: Iterable[str] = (),
+        token_ids: Iterable[str] = (),
+    ):
+        """Reloads the epochs of `user_ids` and the `token_ids` revocations."""
+        user_ids = [uuid.UUID(str(user_id)) for user_id in user_ids]
+        if user_ids:
+            result = await db.execute(
+                select(user_model.id, user_model.token_version).where(
+                    user_model.id.in_(user_ids)
+                )
+            )
+            for user_id, version in result.all():
+                self._set_epoch(user_id, version)
+
+        token_ids = list(token_ids)
+        if token_ids:
+            result = await db.execute(
+                select(
+                    revoked_tokens.c.jti, revoked_tokens.c.expires_at
+                ).where(revoked_tokens.c.jti.in_(token_ids))
+            )
+            for jti, expires_at in result.all():
+                self._tokens[jti] = _timestamp(expires_at)
+            self._prune()
@@ -0,0 +1,125 @@
+import json
+import mmap
+import os
+import struct
+
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .policy import PolicyGraph
+from .snapshot import export_policy_snapshot, graph_from_snapshot
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_MAGIC = b'FORBACP1'
+# magic (8 bytes) + generation (uint64) + snapshot version hash
+_HEADER = struct.Struct('<8sQ16s')
+
+
+class SharedPolicyStore:
+    """
+    Compiled policy shared by every worker process on a host.
+    `path` is a small memory-mapped control file holding a generation
+    counter; each generation's snapshot lives in `{path}.{generation}`.
+    Readers notice a new generation with a plain memory read (no syscall)
+    and parse the snapshot once per generation. Put `path` on a tmpfs such
+    as `/dev/shm` to keep everything in shared memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._control: Optional[mmap.mmap] = None
+        self._generation = 0
+        self._graph: Optional[PolicyGraph] = None
+
+    def _open_control(self) -> mmap.mmap:
+        if self._control is None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if os.fstat(fd).st_size < _HEADER.size:
+                    os.ftruncate(fd, _HEADER.size)
+                self._control = mmap.mmap(fd, _HEADER.size)
+            finally:
+                os.close(fd)
+        return self._control
+
+    def _read_header(self):
+        magic, generation, version = _HEADER.unpack_from(self._open_control())
+        if magic != _MAGIC:
+            return 0, ''
+        return generation, version.decode()
+
+    @property
+    def generation(self) -> int:
+        """Latest published generation (0 when nothing was published yet)."""
+        return self._read_header()[0]
+
+    @contextmanager
+    def _writer_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_graph(self) -> Optional[PolicyGraph]:
+        """Returns the latest published policy, or None if there is none."""
+        generation = self.generation
+        if generation == self._generation:
+            return self._graph
+        if generation == 0:
+            return None
+
+        try:
+            with open(f'{self.path}.{generation}', 'rb') as f:
+                snapshot = json.loads(f.read())
+        except FileNotFoundError:
+            # Superseded while we were reading; use the next lookup's generation
+            return self._graph
+
+        self._graph = graph_from_snapshot(snapshot)
+        self._generation = generation
+        return self._graph
+
+    async def publish(self, db: AsyncSession) -> int:
+        """
+        Exports the policy from `db` and publishes it as a new generation,
+        unless it is identical to the latest one. Returns the generation.
+        """
+        control = self._open_control()
+        snapshot = await export_policy_snapshot(db)
+
+        with self._writer_lock():
+            previous, version = self._read_header()
+            if version == snapshot['version']:
+                return previous
+            generation = previous + 1
+            tmp_path = f'{self.path}.{generation}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, f'{self.path}.{generation}')
+            _HEADER.pack_into(
+                control, 0, _MAGIC, generation, snapshot['version'].encode()
+            )
+            control.flush()
+
+        if previous:
+            try:
+                os.remove(f'{self.path}.{previous}')
+            except OSError:
+                pass
+        return generation
+
+    def close(self):
+        if self._control is not None:
+            self._control.close()
+            self._control = None
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+
+from typing import Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .policy import PolicyGraph
+
+SNAPSHOT_FORMAT = 1
+
+
+def _content_hash(content: dict) -> str:
+    raw = json.dumps(content, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def snapshot_from_graph(graph: PolicyGraph) -> dict:
+    """
+    Serializes a full `PolicyGraph` into a JSON-compatible snapshot.
+    Rows are sorted, so the same policy always yields the same `version`.
+    """
+    permission_parents = {}
+    for parent_id, children in graph.permission_children.items():
+        for child_id in children:
+            permission_parents[child_id] = parent_id
+
+    content = {
+        'roles': sorted(
+            [
+                role_id,
+                name,
+                graph.role_parents[role_id],
+                graph.role_tenants[role_id],
+            ]
+            for role_id, name in graph.role_names.items()
+        ),
+        'permissions': sorted(
+            [perm_id, name, permission_parents.get(perm_id)]
+            for perm_id, name in graph.permission_names.items()
+        ),
+        'role_permissions': sorted(
+            [role_id, perm_id]
+            for role_id, perm_ids in graph.role_permissions.items()
+            for perm_id in perm_ids
+        ),
+    }
+    return {
+        'format': SNAPSHOT_FORMAT,
+        'version': _content_hash(content),
+        **content,
+    }
+
+
+def graph_from_snapshot(snapshot: dict) -> PolicyGraph:
+    """Rebuilds the `PolicyGraph` described by `snapshot`."""
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError('Unsupported policy snapshot format')
+    content = {
+        key: snapshot[key]
+        for key in ('roles', 'permissions', 'role_permissions')
+    }
+    if _content_hash(content) != snapshot.get('version'):
+        raise ValueError('Snapshot version does not match its content')
+
+    role_names = {}
+    role_parents = {}
+    role_tenants = {}
+    for role_id, name, parent_id, tenant_id in content['roles']:
+        role_names[role_id] = name
+        role_parents[role_id] = parent_id
+        role_tenants[role_id] = tenant_id
+
+    permission_names = {}
+    permission_children: Dict[int, List[int]] = {}
+    for perm_id, name, parent_id in content['permissions']:
+        permission_names[perm_id] = name
+        if parent_id is not None:
+            permission_children.setdefault(parent_id, []).append(perm_id)
+
+    role_perms: Dict[int, List[int]] = {}
+    for role_id, perm_id in content['role_permissions']:
+        role_perms.setdefault(role_id, []).append(perm_id)
+
+    return PolicyGraph(
+        0,
+        role_names,
+        role_parents,
+        role_tenants,
+        role_perms,
+        permission_names,
+        permission_children,
+    )
+
+
+async def export_policy_snapshot(db: AsyncSession) -> dict:
+    """Reads the whole role/permission policy into a snapshot (three queries)."""
+    return snapshot_from_graph(await PolicyGraph.load(db))
+
+
+def write_policy_snapshot(snapshot: dict, path: str):
+    """Writes `snapshot` atomically, so readers never see a partial file."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def read_policy_snapshot(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,156 @@
+from typing import Any, Optional, Set, Union
+
+from sqlalchemy import (
+    and_,
+    cast,
+    exists,
+    false,
+    func,
+    not_,
+    null,
+    or_,
+    select,
+    true,
+)
+from sqlalchemy.sql.elements import ColumnElement
+
+from ..database.models import (
+    Permission,
+    Role,
+    UserBaseMixin,
+    role_permissions,
+    user_roles,
+)
+from .logic import And, Not, Or, Requirement
+from .logic import Permission as PermissionRequirement
+from .principal import Principal, UserPrincipal
+
+
+def _granting_names(name: str) -> Set[str]:
+    """Names granting `name`: itself, '*' and every 'prefix:*' above it."""
+    names = {name, '*'}
+    i = name.find(':')
+    while i != -1:
+        names.add(f'{name[:i]}:*')
+        i = name.find(':', i + 1)
+    return names
+
+
+def permission_clause(
+    name: str, user_id: Any, tenant_id: Any = None
+) -> ColumnElement:
+    """
+    Builds an EXISTS predicate that is true when the user `user_id` holds
+    permission `name`, following role inheritance, permission hierarchy and
+    wildcards exactly like `RBACManager`.
+    `user_id` and `tenant_id` may be plain values or columns of the outer
+    query (e.g. `Document.owner_id`), in which case the predicate is
+    evaluated per row.
+    """
+    # Permissions granting `name`: its own row, wildcards and ancestors
+    perm_tree = (
+        select(
+            Permission.id.label('permission_id'),
+            Permission.parent_id.label('parent_id'),
+        )
+        .where(Permission.name.in_(sorted(_granting_names(name))))
+        .cte(recursive=True)
+    )
+    perm_tree = perm_tree.union(
+        select(Permission.id, Permission.parent_id).where(
+            Permission.id == perm_tree.c.parent_id
+        )
+    )
+
+    # Roles granting them, plus every role inheriting from those. The tenant
+    # column is the tenant the inheritance chain is restricted to (if any).
+    role_tree = (
+        select(
+            role_permissions.c.role_id.label('role_id'),
+            cast(null(), Role.tenant_id.type).label('tenant_id'),
+        )
+        .where(
+            role_permissions.c.permission_id.in_(
+                select(perm_tree.c.permission_id)
+            )
+        )
+        .cte(recursive=True)
+    )
+    role_tree = role_tree.union(
+        select(
+            Role.id, func.coalesce(role_tree.c.tenant_id, Role.tenant_id)
+        ).where(
+            Role.parent_id == role_tree.c.role_id,
+            or_(
+                Role.tenant_id.is_(None),
+                role_tree.c.tenant_id.is_(None),
+                Role.tenant_id == role_tree.c.tenant_id,
+            ),
+        )
+    )
+
+    return exists().where(
+        user_roles.c.user_id == user_id,
+        user_roles.c.role_id == role_tree.c.role_id,
+        or_(
+            role_tree.c.tenant_id.is_(None),
+            role_tree.c.tenant_id == tenant_id,
+        ),
+    )
+
+
+def requirement_clause(
+    requirement: Union[str, Requirement],
+    user: Any,
+    tenant_id: Any = None,
+) -> ColumnElement:
+    """
+    Translates `requirement` into a SQL predicate for `user`, to be used in
+    any `select()` so the database only returns authorized rows:
+
+        stmt = select(Document).where(
+            requirement_clause('documents:read', current_user)
+        )
+
+    `user` is a `User` or cached `UserPrincipal` (its id and tenant are
+    used), a stateless `Principal`
+    (evaluated in Python, as it has no database identity) or a user id
+    value/column together with `tenant_id`.
+    Raises ValueError for custom `Requirement` subclasses.
+    """
+    if isinstance(requirement, str):
+        requirement = PermissionRequirement(requirement)
+
+    if isinstance(user, Principal):
+        return true() if requirement.evaluate(user.permissions) else false()
+
+    user_id = user
+    if isinstance(user, (UserBaseMixin, UserPrincipal)):
+        user_id, tenant_id = user.id, user.tenant_id
+    return _translate(requirement, user_id, tenant_id)
+
+
+def _translate(
+    requirement: Requirement, user_id: Any, tenant_id: Optional[Any]
+) -> ColumnElement:
+    if type(requirement) is PermissionRequirement:
+        return permission_clause(requirement.name, user_id, tenant_id)
+    if type(requirement) is And:
+        return and_(
+            true(),
+            *(
+                _translate(r, user_id, tenant_id)
+                for r in requirement.requirements
+            )
+        )
+    if type(requirement) is Or:
+        return or_(
+            false(),
+            *(
+                _translate(r, user_id, tenant_id)
+                for r in requirement.requirements
+            )
+        )
+    if type(requirement) is Not:
+        return not_(_translate(requirement.requirement, user_id, tenant_id))
+    raise ValueError(f'Cannot translate {type(requirement).__name__} to SQL')
@@ -9,6 +9,7 @@ from sqlalchemy.orm import selectinload
 from sqlalchemy import select
 from fastapi_oauth_rbac.database.models import Base, User, Role, Permission
 from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.policy import PolicyCache
 from fastapi_oauth_rbac.core.security import hash_password, verify_password
 
 
@@ -84,3 +85,36 @@ async def test_has_role():
         rbac = RBACManager(db)
         assert await rbac.has_role(user, 'admin') is True
     await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_inherited_roles_with_and_without_policy_cache():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with AsyncSessionLocal() as db:
+        base = Role(name='base')
+        manager = Role(name='manager', parent=base)
+        lead = Role(name='lead', parent=manager)
+        unrelated = Role(name='unrelated')
+        user = User(email='lead@test.com', roles=[lead])
+        db.add_all([base, manager, lead, unrelated, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        for rbac in (RBACManager(db), RBACManager(db, PolicyCache())):
+            assert await rbac.get_user_roles(user) == {
+                'lead',
+                'manager',
+                'base',
+            }
+            assert await rbac.has_role(user, 'base') is True
+            assert await rbac.has_role(user, 'unrelated') is False
+            assert await rbac.has_any_role(user, ['unrelated', 'manager'])
+            assert not await rbac.has_any_role(user, ['unrelated'])
+            assert await rbac.has_all_roles(user, ['lead', 'base'])
+            assert not await rbac.has_all_roles(user, ['lead', 'unrelated'])
+    await engine.dispose()
@@ -0,0 +1,50 @@
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings, get_current_user
+from fastapi_oauth_rbac.rbac.dependencies import requires_permission
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+
+
+def test_user_and_permissions_resolved_once_per_request(tmp_path, monkeypatch):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/ctx.db',
+        ADMIN_PASSWORD='admin-password',
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get(
+        '/reports',
+        dependencies=[
+            requires_permission('reports:read'),
+            requires_permission('reports:export'),
+        ],
+    )
+    async def reports(user=Depends(get_current_user)):
+        return {'email': user.email}
+
+    resolutions = []
+    original = RBACManager._resolve_permissions
+
+    async def counting_resolve(self, user):
+        resolutions.append(user.email)
+        return await original(self, user)
+
+    monkeypatch.setattr(RBACManager, '_resolve_permissions', counting_resolve)
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+
+        resolutions.clear()
+        response = client.get(
+            '/reports', headers={'Authorization': f'Bearer {token}'}
+        )
+        assert response.status_code == 200
+        assert response.json() == {'email': settings.ADMIN_EMAIL}
+        assert resolutions == [settings.ADMIN_EMAIL]
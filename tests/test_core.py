@@ -1,9 +1,24 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from jose import JWTError
+
 from fastapi_oauth_rbac.core.security import (
     hash_password,
     verify_password,
     create_access_token,
     decode_token,
+    encode_scopes,
+    hash_password_async,
+    PasswordHashOverloaded,
+    PasswordHashPool,
+    token_cache,
+    verify_password_async,
 )
+from fastapi_oauth_rbac.core.config import Settings
 
 
 def test_password_hashing():
@@ -20,3 +35,141 @@ def test_jwt_token():
     decoded = decode_token(token)
     assert decoded['sub'] == 'test@example.com'
     assert 'exp' in decoded
+
+
+def test_large_scopes_are_compressed():
+    small = encode_scopes(['users:*', 'docs:read'])
+    assert small == {'scopes': ['docs:read', 'users:*']}
+
+    scopes = [f'resource{i}:read' for i in range(500)]
+    claims = encode_scopes(scopes)
+    assert 'scopes' not in claims
+
+    token = create_access_token({'sub': 'test@example.com', **claims})
+    assert len(token) < len(str(scopes))
+    decoded = decode_token(token)
+    assert decoded['scopes'] == sorted(scopes)
+    assert 'scz' not in decoded
+
+
+def test_token_cache_reuses_verified_payloads(monkeypatch):
+    settings = Settings(TOKEN_CACHE_ENABLED=True, JWT_SECRET_KEY='key-1')
+    token_cache.clear()
+    hits, misses = token_cache.hits, token_cache.misses
+    token = create_access_token({'sub': 'a@example.com'}, settings=settings)
+
+    decoded = decode_token(token, settings=settings)
+    decoded['sub'] = 'mutated'
+    assert decode_token(token, settings=settings)['sub'] == 'a@example.com'
+    assert (token_cache.hits - hits, token_cache.misses - misses) == (1, 1)
+
+    # Garbage is rejected from the cache the second time
+    for _ in range(2):
+        with pytest.raises(JWTError):
+            decode_token('not-a-token', settings=settings)
+    assert token_cache.hits - hits == 2
+
+    # A rotated key never serves payloads verified with the old one
+    rotated = Settings(TOKEN_CACHE_ENABLED=True, JWT_SECRET_KEY='key-2')
+    with pytest.raises(JWTError):
+        decode_token(token, settings=rotated)
+
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_off_the_event_loop():
+    hashed = await hash_password_async('secret_password')
+    assert await verify_password_async('secret_password', hashed) is True
+    assert await verify_password_async('wrong_password', hashed) is False
+
+    pool = PasswordHashPool(max_workers=2)
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def slow_hash(n):
+        with lock:
+            active.append(n)
+            peak.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.remove(n)
+        return n
+
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    beat = asyncio.create_task(heartbeat())
+    jobs = [asyncio.create_task(pool.run(slow_hash, n)) for n in range(6)]
+    await asyncio.sleep(0.01)
+    assert pool.running == 2 and pool.waiting == 4
+    assert await asyncio.gather(*jobs) == list(range(6))
+    beat.cancel()
+    pool.shutdown()
+
+    assert max(peak) == 2
+    assert pool.completed == 6 and pool.waiting == 0
+    # The loop kept serving while three rounds of hashing ran
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_password_hash_pool_sheds_load():
+    release = threading.Event()
+    pool = PasswordHashPool(max_workers=1, max_queue=1, queue_timeout=0.2)
+
+    running = asyncio.create_task(pool.run(release.wait))
+    queued = asyncio.create_task(pool.run(lambda: 'queued'))
+    await asyncio.sleep(0.01)
+
+    # Queue full: rejected right away
+    with pytest.raises(PasswordHashOverloaded) as exc:
+        await pool.run(lambda: 'rejected')
+    assert exc.value.retry_after >= 1
+
+    # Waited past the deadline: rejected too
+    with pytest.raises(PasswordHashOverloaded):
+        await queued
+    release.set()
+    await running
+    assert await pool.run(lambda: 'ok') == 'ok'
+    assert pool.rejected == 2
+    pool.shutdown()
+
+
+def test_overloaded_password_hashing_returns_503(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from fastapi_oauth_rbac import FastAPIOAuthRBAC
+    from fastapi_oauth_rbac.core.security import password_pool
+
+    app = FastAPI()
+    auth = FastAPIOAuthRBAC(
+        app,
+        settings=Settings(
+            DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/shed.db',
+            ADMIN_PASSWORD='admin-password',
+        ),
+    )
+    auth.include_auth_router()
+
+    with TestClient(app) as client:
+
+        async def overloaded(fn, *args):
+            raise PasswordHashOverloaded(7)
+
+        monkeypatch.setattr(password_pool, 'run', overloaded)
+        response = client.post(
+            '/auth/login',
+            data={'username': 'admin@example.com', 'password': 'x'},
+        )
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '7'
+        # Routes that don't hash passwords are unaffected
+        response = client.get('/auth/.well-known/jwks.json')
+        assert response.status_code == 200
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.database.models import Base, Role
+from fastapi_oauth_rbac.rbac.invalidation import (
+    POLICY,
+    RESET,
+    USER,
+    DatabaseInvalidationBackend,
+    InMemoryInvalidationBackend,
+    InvalidationBus,
+    InvalidationEvent,
+)
+
+
+async def _session_factory():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+
+@pytest.mark.asyncio
+async def test_database_backend_delivers_events_in_order():
+    engine, session_factory = await _session_factory()
+    received = []
+    node_a = InvalidationBus(DatabaseInvalidationBackend(retention=2))
+    node_b = InvalidationBus(DatabaseInvalidationBackend(retention=2))
+    node_b.subscribe(received.append)
+
+    async with session_factory() as db:
+        await node_a.sync(db)
+        await node_b.sync(db)
+
+        await node_a.publish(db, InvalidationEvent(POLICY, role_id=7))
+        assert await node_b.poll(db) == 1
+        assert [(e.kind, e.role_id, e.version) for e in received] == [
+            (POLICY, 7, 1)
+        ]
+        assert node_a.version == node_b.version == 1
+        assert await node_b.poll(db) == 0
+
+        # User and token events leave the policy version (`pv`) alone
+        await node_a.publish(db, InvalidationEvent(USER, user_id='u1'))
+        await node_b.poll(db)
+        assert node_b.version == 2 and node_b.policy_version == 1
+
+        # Node B falls behind the retained window and is told to reset
+        for role_id in (8, 9, 10):
+            await node_a.publish(db, InvalidationEvent(POLICY, role_id=role_id))
+        received.clear()
+        await node_b.poll(db)
+        assert [e.kind for e in received] == [RESET]
+        assert node_b.version == node_b.policy_version == 5
+
+        # Nodes joining later start from the same policy version
+        node_c = InvalidationBus(DatabaseInvalidationBackend())
+        await node_a.publish(db, InvalidationEvent(USER, user_id='u1'))
+        await node_c.sync(db)
+        assert (node_c.version, node_c.policy_version) == (6, 5)
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_tenant_role_change_evicts_only_that_tenant_on_other_nodes():
+    engine, session_factory = await _session_factory()
+    backend = InMemoryInvalidationBackend()
+    settings = Settings(
+        DATABASE_URL='sqlite+aiosqlite:///:memory:', POLICY_CACHE_ENABLED=True
+    )
+    node_a = FastAPIOAuthRBAC(
+        FastAPI(), settings=settings, invalidation_backend=backend
+    )
+    node_b = FastAPIOAuthRBAC(
+        FastAPI(), settings=settings, invalidation_backend=backend
+    )
+
+    async with session_factory() as db:
+        db.add_all(
+            [
+                Role(name='x-editor', tenant_id='x'),
+                Role(name='y-editor', tenant_id='y'),
+            ]
+        )
+        await db.commit()
+
+        graph_x = await node_b.policy_cache.get_graph(db, 'x')
+        graph_y = await node_b.policy_cache.get_graph(db, 'y')
+
+        await node_a.policy_changed(db, [1], tenant_id='x')
+        assert node_a.policy_version == 1
+        assert node_b.policy_version == 0
+
+        await node_b.invalidation_bus.poll(db)
+        assert node_b.policy_version == 1
+
+        # A user change (e.g. a logout) keeps issued token scopes valid
+        await node_a.user_changed(db, 'u1')
+        assert node_a.policy_version == node_b.policy_version == 1
+        assert await node_b.policy_cache.get_graph(db, 'y') is graph_y
+        assert await node_b.policy_cache.get_graph(db, 'x') is not graph_x
+
+    await engine.dispose()
+
+
+def test_database_bus_runs_with_the_app(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/bus.db',
+        POLICY_CACHE_ENABLED=True,
+        INVALIDATION_BACKEND='database',
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+
+    with TestClient(app):
+        # setup_defaults published its change through the bus
+        assert auth.policy_version == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_polls_back_off_and_are_logged(caplog):
+    attempts = []
+    failing = [True]
+
+    class Session:
+        async def __aenter__(self):
+            attempts.append(asyncio.get_running_loop().time())
+            if failing[0]:
+                raise RuntimeError('no such table: policy_version')
+            return None
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class Bus(InvalidationBus):
+        async def poll(self, db):
+            return 0
+
+    bus = Bus(InMemoryInvalidationBackend())
+    with caplog.at_level(logging.WARNING):
+        task = asyncio.create_task(
+            bus.run(Session, interval=0.001, max_backoff=0.02)
+        )
+        await asyncio.sleep(0.2)
+        failing[0] = False
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    # Backed off: far fewer attempts than 0.2s / 1ms
+    assert 3 < len(attempts) < 50
+    messages = [record.getMessage() for record in caplog.records]
+    assert len([m for m in messages if 'poll failed' in m]) == 1
+    assert any('recovered' in m for m in messages)
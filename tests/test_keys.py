@@ -0,0 +1,88 @@
+import pytest
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import JWTError, jwt
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.core.keys import get_signing_keys
+from fastapi_oauth_rbac.core.security import create_access_token, decode_token
+
+
+def _key_pair():
+    key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ).decode()
+    public_pem = (
+        key.public_key()
+        .public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+    return private_pem, public_pem
+
+
+def test_rotated_asymmetric_keys_and_jwks(tmp_path):
+    old_private, old_public = _key_pair()
+    new_private, _ = _key_pair()
+
+    old_settings = Settings(
+        JWT_ALGORITHM='ES256', JWT_PRIVATE_KEY=old_private, JWT_KEY_ID='k1'
+    )
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/keys.db',
+        JWT_ALGORITHM='ES256',
+        JWT_PRIVATE_KEY=new_private,
+        JWT_KEY_ID='k2',
+        JWT_VERIFICATION_KEYS={'k1': old_public},
+    )
+
+    old_token = create_access_token(
+        {'sub': 'a@example.com'}, settings=old_settings
+    )
+    new_token = create_access_token({'sub': 'b@example.com'}, settings=settings)
+    assert jwt.get_unverified_header(new_token)['kid'] == 'k2'
+
+    # Tokens signed with the retired key stay valid until they expire
+    assert decode_token(old_token, settings=settings)['sub'] == 'a@example.com'
+    assert decode_token(new_token, settings=settings)['sub'] == 'b@example.com'
+    # ...but the old configuration knows nothing about the new key
+    with pytest.raises(JWTError):
+        decode_token(new_token, settings=old_settings)
+
+    app = FastAPI()
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    with TestClient(app) as client:
+        response = client.get('/auth/.well-known/jwks.json')
+        assert response.headers['Cache-Control'] == 'public, max-age=300'
+        jwks = response.json()
+
+    assert [key['kid'] for key in jwks['keys']] == ['k1', 'k2']
+    assert all('d' not in key for key in jwks['keys'])
+    # Another service verifies locally from the published key set
+    claims = jwt.decode(new_token, jwks, algorithms=['ES256'])
+    assert claims['sub'] == 'b@example.com'
+
+
+def test_asymmetric_keys_without_kid_are_published_by_thumbprint():
+    private_pem, _ = _key_pair()
+    settings = Settings(JWT_ALGORITHM='ES256', JWT_PRIVATE_KEY=private_pem)
+
+    keys = get_signing_keys(settings)
+    jwks = keys.jwks()
+    assert [key['kid'] for key in jwks['keys']] == [keys.key_id]
+    assert len(keys.key_id) == 43
+
+    token = create_access_token({'sub': 'a@example.com'}, settings=settings)
+    assert jwt.get_unverified_header(token)['kid'] == keys.key_id
+    claims = jwt.decode(token, jwks, algorithms=['ES256'])
+    assert claims['sub'] == 'a@example.com'
@@ -0,0 +1,95 @@
+from fastapi_oauth_rbac.rbac.logic import (
+    And,
+    Not,
+    Or,
+    Permission,
+    PermissionRegistry,
+    PermissionSet,
+    Requirement,
+)
+
+
+def test_permission_set_matching():
+    perms = PermissionSet(['users:read', 'dashboard.audit:*', 'files:docs:*'])
+    assert perms.matches('users:read')
+    assert not perms.matches('users:write')
+    assert perms.matches('dashboard.audit:read')
+    assert not perms.matches('dashboard:read')
+    assert perms.matches('files:docs:edit')
+    assert not perms.matches('files:images:edit')
+
+    assert PermissionSet(['*']).matches('anything:at:all')
+    assert PermissionSet.of(perms) is perms
+    # Still a plain set for exact membership
+    assert 'users:read' in perms and 'dashboard.audit:read' not in perms
+
+
+def test_requirements_evaluate_against_permission_sets():
+    requirement = And('users:read', Or('billing:refund', 'dashboard.audit:read'))
+    assert requirement.evaluate({'users:read', 'dashboard.audit:*'})
+    assert requirement.evaluate(PermissionSet(['users:*', 'billing:refund']))
+    assert not requirement.evaluate({'users:read'})
+    assert Not('users:delete').evaluate({'users:read'})
+    assert not Not('users:delete').evaluate({'users:*'})
+
+
+def test_compiled_requirements_match_evaluate():
+    registry = PermissionRegistry()
+    requirement = And(
+        'users:read',
+        Or('billing:refund', 'dashboard.audit:read'),
+        Not('users:delete'),
+    )
+    compiled = requirement.compile(registry)
+    cases = [
+        {'users:read', 'dashboard.audit:*'},
+        {'users:*', 'billing:refund'},
+        {'users:read'},
+        {'users:read', 'users:delete', 'billing:refund'},
+        {'*'},
+        set(),
+    ]
+    for perms in cases:
+        perm_set = PermissionSet(perms)
+        assert compiled(perm_set.mask(registry)) == requirement.evaluate(
+            perm_set
+        ), perms
+
+
+def test_custom_requirements_are_not_compiled():
+    class AlwaysAllow(Requirement):
+        def evaluate(self, user_permissions):
+            return True
+
+        def get_permission_names(self):
+            return set()
+
+    assert AlwaysAllow().compile() is None
+    assert Or('a:b', AlwaysAllow()).compile() is None
+
+
+def test_subclasses_of_builtin_requirements_are_not_compiled():
+    class OwnerOnly(Permission):
+        def evaluate(self, user_permissions):
+            return False
+
+    class Never(And):
+        def evaluate(self, user_permissions):
+            return False
+
+    for requirement in (
+        OwnerOnly('docs:read'),
+        And('docs:write', OwnerOnly('docs:read')),
+        Not(OwnerOnly('docs:read')),
+        Never('docs:read'),
+    ):
+        assert requirement.compile() is None, requirement
+    assert not And(OwnerOnly('docs:read')).evaluate({'docs:read'})
+
+
+def test_permission_set_minimal_drops_covered_names():
+    perms = PermissionSet(['users:*', 'users:read', 'users:roles:*', 'docs:read'])
+    assert perms.minimal() == {'users:*', 'docs:read'}
+    assert PermissionSet(['*', 'docs:read']).minimal() == {'*'}
+    plain = PermissionSet(['docs:read'])
+    assert plain.minimal() is plain
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.database.models import (
+    Base,
+    User,
+    Role,
+    Permission,
+    role_effective_permissions,
+)
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.materialized import (
+    refresh_role_effective_permissions,
+)
+
+
+@pytest.mark.asyncio
+async def test_materialized_permissions_are_maintained_incrementally():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async with AsyncSessionLocal() as db:
+        view_p = Permission(name='view')
+        manage_p = Permission(name='manage', children=[view_p])
+        audit_p = Permission(name='audit')
+        db.add_all([view_p, manage_p, audit_p])
+
+        base = Role(name='base', permissions=[view_p])
+        manager = Role(name='manager', parent=base, permissions=[manage_p])
+        user = User(email='mgr@example.com', roles=[manager])
+        db.add_all([base, manager, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        assert await refresh_role_effective_permissions(db) == (3, 0)
+        await db.commit()
+        # Nothing changed, nothing written
+        assert await refresh_role_effective_permissions(db) == (0, 0)
+
+        rbac = RBACManager(db, resolution='materialized')
+        assert await rbac.get_user_permissions(user) == {'manage', 'view'}
+
+        # Granting to the parent only touches the parent and its descendants
+        await db.refresh(base, ['permissions'])
+        base.permissions.append(audit_p)
+        await db.commit()
+        assert await refresh_role_effective_permissions(db, [base.id]) == (2, 0)
+        await db.commit()
+
+        rbac = RBACManager(db, resolution='materialized')
+        assert await rbac.get_user_permissions(user) == {
+            'manage',
+            'view',
+            'audit',
+        }
+
+        manager_id = manager.id
+        await db.delete(manager)
+        await db.commit()
+        assert await refresh_role_effective_permissions(db, [manager_id]) == (
+            0,
+            3,
+        )
+        await db.commit()
+
+        result = await db.execute(select(role_effective_permissions.c.role_id))
+        assert set(result.scalars().all()) == {base.id}
+
+
+def test_deleting_a_parent_role_refreshes_its_children(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/materialized.db',
+        ADMIN_PASSWORD='admin-password',
+        PERMISSION_RESOLUTION='materialized',
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+    auth.include_dashboard()
+
+    async def add_roles():
+        async with auth.db_sessionmaker() as db:
+            view_p = Permission(name='view')
+            manage_p = Permission(name='manage')
+            base = Role(name='base', permissions=[view_p])
+            manager = Role(name='manager', parent=base, permissions=[manage_p])
+            db.add_all([view_p, manage_p, base, manager])
+            await db.commit()
+            await auth.policy_changed(db, [base.id, manager.id])
+            return base.id, manager.id
+
+    async def effective(role_id):
+        async with auth.db_sessionmaker() as db:
+            user = User(email=f'{role_id}@example.com')
+            user.roles = [await db.get(Role, role_id)]
+            return await RBACManager(
+                db, resolution='materialized'
+            ).get_user_permissions(user)
+
+    with TestClient(app) as client:
+        base_id, manager_id = asyncio.run(add_roles())
+        assert asyncio.run(effective(manager_id)) == {'manage', 'view'}
+
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        response = client.post(
+            f'/auth/dashboard/role/delete/{base_id}',
+            headers={
+                'Authorization': f'Bearer {response.json()["access_token"]}'
+            },
+            follow_redirects=False,
+        )
+        assert response.status_code == 303
+        assert asyncio.run(effective(manager_id)) == {'manage'}
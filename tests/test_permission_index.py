@@ -0,0 +1,69 @@
+import pytest
+
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
+
+from fastapi_oauth_rbac.database.models import Base, User, Role, Permission
+from fastapi_oauth_rbac.rbac.index import PermissionIndex, PermissionIndexCache
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+
+
+def test_prefix_lookup_and_expansion():
+    index = PermissionIndex(
+        ['users:read', 'users:write', 'users.audit:read', 'userx:read', '*']
+    )
+    assert index.under_prefix('users') == ['users:read', 'users:write']
+    assert index.under_prefix('users.audit') == ['users.audit:read']
+    assert index.under_prefix('missing') == []
+
+    assert index.expand({'users:*'}) == {'users:*', 'users:read', 'users:write'}
+    assert index.expand({'*'}) == {
+        '*',
+        'users:read',
+        'users:write',
+        'users.audit:read',
+        'userx:read',
+    }
+    exact = {'users:read'}
+    assert index.expand(exact) is exact
+
+
+@pytest.mark.asyncio
+async def test_unexpanded_permissions_for_access_checks():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    async with AsyncSessionLocal() as db:
+        wildcard = Permission(name='billing:*')
+        db.add_all(
+            [
+                wildcard,
+                Permission(name='billing:read'),
+                Permission(name='billing:refund'),
+                Permission(name='reports:read'),
+            ]
+        )
+        role = Role(name='billing', permissions=[wildcard])
+        user = User(email='billing@example.com', roles=[role])
+        db.add_all([role, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        rbac = RBACManager(db, permission_index=PermissionIndexCache())
+        assert await rbac.get_user_permissions(user, expand=False) == {
+            'billing:*'
+        }
+        assert await rbac.get_user_permissions(user) == {
+            'billing:*',
+            'billing:read',
+            'billing:refund',
+        }
+        assert await rbac.has_permission(user, 'billing:refund') is True
+        assert await rbac.has_permission(user, 'reports:read') is False
+    await engine.dispose()
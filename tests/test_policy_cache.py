@@ -0,0 +1,148 @@
+import pytest
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.database.models import Base, User, Role, Permission
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.policy import PolicyCache
+
+
+@pytest.mark.asyncio
+async def test_cached_resolution_matches_db_and_skips_queries():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2]),
+    )
+
+    async with AsyncSessionLocal() as db:
+        view_p = Permission(name='docs:view')
+        manage_p = Permission(name='docs:manage', children=[view_p])
+        wildcard_p = Permission(name='reports:*')
+        report_p = Permission(name='reports:read')
+        base = Role(name='base', permissions=[manage_p])
+        child = Role(name='child', parent=base, permissions=[wildcard_p])
+        user = User(email='cache@example.com', roles=[child])
+        db.add_all([view_p, manage_p, wildcard_p, report_p, base, child, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        expected = await RBACManager(db).get_user_permissions(user)
+        assert expected == {
+            'docs:manage',
+            'docs:view',
+            'reports:*',
+            'reports:read',
+        }
+
+        cache = PolicyCache()
+        rbac = RBACManager(db, policy_cache=cache)
+        assert await rbac.get_user_permissions(user) == expected
+
+        statements.clear()
+        assert await rbac.get_user_permissions(user) == expected
+        assert await rbac.has_permission(user, 'docs:view') is True
+        assert statements == []
+
+        # Invalidation picks up new grants on the next lookup
+        base.permissions.append(Permission(name='docs:delete'))
+        await db.commit()
+        assert 'docs:delete' not in await rbac.get_user_permissions(user)
+        cache.invalidate()
+        assert 'docs:delete' in await rbac.get_user_permissions(user)
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_tenant_partitions_share_global_roles():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async with AsyncSessionLocal() as db:
+        read_p = Permission(name='docs:read')
+        write_p = Permission(name='docs:write')
+        admin_p = Permission(name='tenant:admin')
+        base = Role(name='member', permissions=[read_p])
+        editor_a = Role(
+            name='editor-a', tenant_id='a', parent=base, permissions=[write_p]
+        )
+        admin_b = Role(
+            name='admin-b', tenant_id='b', parent=base, permissions=[admin_p]
+        )
+        user_a = User(email='a@example.com', tenant_id='a', roles=[editor_a])
+        user_b = User(email='b@example.com', tenant_id='b', roles=[admin_b])
+        db.add_all(
+            [read_p, write_p, admin_p, base, editor_a, admin_b, user_a, user_b]
+        )
+        await db.commit()
+        for user in (user_a, user_b):
+            await db.refresh(user, ['roles'])
+
+        cache = PolicyCache(max_tenants=2)
+        rbac = RBACManager(db, policy_cache=cache)
+        assert await rbac.get_user_permissions(user_a) == {
+            'docs:read',
+            'docs:write',
+        }
+        assert await rbac.get_user_permissions(user_b) == {
+            'docs:read',
+            'tenant:admin',
+        }
+        assert await rbac.get_user_roles(user_a) == {'editor-a', 'member'}
+
+        graph_a = await cache.get_graph(db, 'a')
+        graph_b = await cache.get_graph(db, 'b')
+        assert editor_a.id in graph_a.role_names
+        assert admin_b.id not in graph_a.role_names
+        assert graph_a.permission_names is graph_b.permission_names
+
+        # A tenant edit only drops that tenant's partition
+        cache.invalidate('a')
+        assert await cache.get_graph(db, 'b') is graph_b
+        graph_a = await cache.get_graph(db, 'a')
+        assert editor_a.id in graph_a.role_names
+
+        # The least recently used tenant is evicted beyond max_tenants
+        await cache.get_graph(db, 'c')
+        assert await cache.get_graph(db, 'a') is graph_a
+        assert await cache.get_graph(db, 'b') is not graph_b
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_setup_defaults_invalidates_policy_cache():
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL='sqlite+aiosqlite:///:memory:', POLICY_CACHE_ENABLED=True
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    assert auth.policy_cache is not None
+
+    async with auth.db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    version = auth.policy_cache.version
+    async with auth.db_sessionmaker() as session:
+        await auth.setup_defaults(session)
+    assert auth.policy_cache.version == version + 1
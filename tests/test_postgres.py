@@ -181,3 +181,39 @@ async def test_postgres_subclassed_user(postgres_container):
     except Exception as e:
         print(f"FAILED Subclassed User: {e}")
         raise e
+
+
+@pytest.mark.asyncio
+async def test_postgres_cte_resolution(postgres_container):
+    from fastapi_oauth_rbac.database.models import User, Role, Permission
+    from fastapi_oauth_rbac.rbac.manager import RBACManager
+    from sqlalchemy.orm import selectinload
+
+    app = FastAPI()
+    settings = Settings(DATABASE_URL=postgres_container)
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+
+    async with auth.db_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with auth.db_sessionmaker() as session:
+        view_p = Permission(name="pg:view")
+        manage_p = Permission(name="pg:manage", children=[view_p])
+        parent = Role(name="pg_parent", permissions=[manage_p])
+        child = Role(name="pg_child", parent=parent)
+        user = User(email="cte@example.com", roles=[child])
+        session.add_all([view_p, manage_p, parent, child, user])
+        await session.commit()
+
+        stmt = (
+            select(User)
+            .where(User.email == "cte@example.com")
+            .options(selectinload(User.roles))
+        )
+        user = (await session.execute(stmt)).scalar_one()
+
+        iterative = await RBACManager(session).get_user_permissions(user)
+        cte = await RBACManager(session, resolution="cte").get_user_permissions(
+            user
+        )
+        assert cte == iterative == {"pg:manage", "pg:view"}
@@ -0,0 +1,106 @@
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+
+from fastapi_oauth_rbac import (
+    FastAPIOAuthRBAC,
+    Settings,
+    User,
+    get_current_db_user,
+    get_current_user,
+)
+from fastapi_oauth_rbac.rbac.dependencies import requires_permission
+from fastapi_oauth_rbac.rbac.principal import (
+    PrincipalCache,
+    RoleRef,
+    UserPrincipal,
+)
+
+
+def test_principal_cache_skips_user_loads_until_user_changes(
+    tmp_path, monkeypatch
+):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/principal.db',
+        ADMIN_PASSWORD='admin-password',
+        PRINCIPAL_CACHE_ENABLED=True,
+        AUTH_REVOCATION_ENABLED=True,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get('/reports', dependencies=[requires_permission('reports:read')])
+    async def reports(user=Depends(get_current_user)):
+        return {'cached': isinstance(user, UserPrincipal)}
+
+    @app.get('/profile')
+    async def profile(user=Depends(get_current_db_user)):
+        return {'orm': isinstance(user, User), 'roles': len(user.roles)}
+
+    loads = []
+    original = UserPrincipal.load.__func__
+
+    async def counting_load(cls, db, user_model, condition):
+        principal = await original(cls, db, user_model, condition)
+        loads.append(principal.email if principal else None)
+        return principal
+
+    monkeypatch.setattr(UserPrincipal, 'load', classmethod(counting_load))
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        headers = {
+            'Authorization': f'Bearer {response.json()["access_token"]}'
+        }
+
+        for _ in range(3):
+            response = client.get('/reports', headers=headers)
+            assert response.json() == {'cached': True}
+        assert loads == [settings.ADMIN_EMAIL]
+
+        response = client.get('/auth/me', headers=headers)
+        assert response.json()['roles'] == ['admin']
+        response = client.get('/profile', headers=headers)
+        assert response.json() == {'orm': True, 'roles': 1}
+        assert len(loads) == 1
+
+        # A global logout evicts the cached principal right away
+        client.post('/auth/logout?global_logout=true', headers=headers)
+        response = client.get('/reports', headers=headers)
+        assert response.status_code == 401
+        assert loads == [settings.ADMIN_EMAIL] * 2
+
+
+def test_principal_cache_bounds_and_invalidation(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(
+        'fastapi_oauth_rbac.rbac.principal.time.monotonic', lambda: now[0]
+    )
+
+    def principal(n):
+        return UserPrincipal(
+            n, f'u{n}@example.com', None, True, True, False, (RoleRef(1, 'r'),)
+        )
+
+    cache = PrincipalCache(max_size=2, ttl=10)
+    for n in range(3):
+        cache.set(f'u{n}', principal(n))
+    # Least recently used entry evicted
+    assert len(cache) == 2 and cache.get('u0') is None
+    assert cache.get('u1').role_ids == frozenset({1})
+
+    cache.invalidate_user(1)
+    assert cache.get('u1') is None
+
+    # Loaded before an invalidation: not cached
+    version = cache.version
+    cache.invalidate()
+    cache.set('u1', principal(1), version)
+    assert cache.get('u1') is None
+
+    cache.set('u1', principal(1), cache.version)
+    now[0] += 11
+    assert cache.get('u1') is None
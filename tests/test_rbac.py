@@ -1,5 +1,6 @@
 import pytest
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
@@ -40,3 +41,142 @@ async def test_rbac_hierarchy():
 
         assert await rbac.has_permission(user, 'view') is True
         assert await rbac.has_permission(user, 'admin') is False
+
+
+@pytest.mark.asyncio
+async def test_cte_resolution_matches_iterative():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2]),
+    )
+
+    async with AsyncSessionLocal() as db:
+        view_p = Permission(name='view')
+        manage_p = Permission(name='manage', children=[view_p])
+        audit_p = Permission(name='audit')
+        other_p = Permission(name='other')
+        db.add_all([view_p, manage_p, audit_p, other_p])
+
+        root = Role(name='root', permissions=[audit_p])
+        # Parent of a foreign-tenant role must not be followed
+        foreign_parent = Role(name='foreign_parent', permissions=[other_p])
+        foreign = Role(
+            name='foreign', tenant_id='acme', parent=foreign_parent
+        )
+        middle = Role(name='middle', parent=root, tenant_id='globex')
+        leaf = Role(name='leaf', parent=middle, permissions=[manage_p])
+        user = User(
+            email='cte@example.com', tenant_id='globex', roles=[leaf, foreign]
+        )
+        db.add_all([root, foreign_parent, foreign, middle, leaf, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        iterative = await RBACManager(db).get_user_permissions(user)
+        assert iterative == {'manage', 'view', 'audit'}
+
+        statements.clear()
+        rbac = RBACManager(db, resolution='cte')
+        assert await rbac.get_user_permissions(user) == iterative
+        assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_permissions_use_constant_queries():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        'before_cursor_execute',
+        lambda *args: statements.append(args[2]),
+    )
+
+    async with AsyncSessionLocal() as db:
+        view_p = Permission(name='docs:view')
+        edit_p = Permission(name='docs:edit', children=[view_p])
+        all_docs = Permission(name='docs:*')
+        base = Role(name='reader', permissions=[view_p])
+        editor = Role(name='editor', parent=base, permissions=[edit_p])
+        owner = Role(name='owner', parent=editor, permissions=[all_docs])
+        users = [
+            User(email='reader@example.com', roles=[base]),
+            User(email='editor@example.com', roles=[editor]),
+            User(email='owner@example.com', roles=[owner]),
+            User(email='nobody@example.com'),
+        ]
+        db.add_all([view_p, edit_p, all_docs, base, editor, owner, *users])
+        await db.commit()
+        for user in users:
+            await db.refresh(user, ['roles'])
+
+        rbac = RBACManager(db)
+        expected = {u.id: await rbac.get_user_permissions(u) for u in users}
+
+        statements.clear()
+        bulk = await rbac.bulk_get_user_permissions(users)
+        assert bulk == expected
+        assert len(statements) <= 5
+
+        allowed = await rbac.bulk_has_permission(users, 'docs:edit')
+        assert [allowed[u.id] for u in users] == [False, True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_check_many_resolves_once():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async with AsyncSessionLocal() as db:
+        view_p = Permission(name='docs:view')
+        users_p = Permission(name='users:*')
+        role = Role(name='support', permissions=[view_p, users_p])
+        user = User(email='support@example.com', roles=[role])
+        db.add_all([view_p, users_p, role, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        rbac = RBACManager(db)
+        resolutions = []
+        original = rbac._resolve_permissions
+
+        async def counting_resolve(u):
+            resolutions.append(u.id)
+            return await original(u)
+
+        rbac._resolve_permissions = counting_resolve
+
+        checks = ['docs:view', 'docs:edit', 'users:delete']
+        assert await rbac.check_many(user, checks) == {
+            'docs:view': True,
+            'docs:edit': False,
+            'users:delete': True,
+        }
+        assert len(resolutions) == 1
+
+        resolutions.clear()
+        assert await rbac.has_any_permission(user, checks) is True
+        assert await rbac.has_all_permissions(user, checks) is False
+        assert await rbac.has_all_permissions(user, checks[::2]) is True
+        assert len(resolutions) == 3
@@ -1,49 +1,179 @@
+import asyncio
+import sqlite3
+
 import pytest
 
-from fastapi import HTTPException
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
 
-from fastapi_oauth_rbac.database.models import Base, User
-from fastapi_oauth_rbac.core.security import create_access_token
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.database.models import User, revoked_tokens
 from fastapi_oauth_rbac.rbac.dependencies import get_current_user
-from fastapi_oauth_rbac.core.config import settings
 
 
-def test_token_revocation():
-    engine = create_engine('sqlite:///:memory:')
-    Base.metadata.create_all(bind=engine)
-    Session = sessionmaker(bind=engine)
-    db = Session()
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/revocation.db',
+        ADMIN_PASSWORD='admin-password',
+        AUTH_REVOCATION_ENABLED=True,
+    )
+
+
+@pytest.fixture
+def make_app(settings):
+    def make_app():
+        app = FastAPI()
+        auth = FastAPIOAuthRBAC(app, settings=settings)
+        auth.include_auth_router()
+
+        @app.get('/whoami')
+        async def whoami(user=Depends(get_current_user)):
+            return {'email': user.email}
+
+        return app, auth
+
+    return make_app
+
+
+@pytest.fixture
+def login(settings):
+    def login(client):
+        """Returns a new session's access and refresh tokens."""
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        body = response.json()
+        client.cookies.clear()
+        return body['access_token'], body['refresh_token']
+
+    return login
+
+
+@pytest.fixture
+def status_of():
+    def status_of(client, token):
+        return client.get(
+            '/whoami', headers={'Authorization': f'Bearer {token}'}
+        ).status_code
+
+    return status_of
+
+
+def test_token_revocation(settings, make_app, login, status_of):
+    app, auth = make_app()
+
+    async def revocation_state():
+        async with auth.db_sessionmaker() as session:
+            jtis = await session.scalars(select(revoked_tokens.c.jti))
+            token_version = await session.scalar(
+                select(User.token_version).where(
+                    User.email == settings.ADMIN_EMAIL
+                )
+            )
+            return len(jtis.all()), token_version
+
+    with TestClient(app) as client:
+        access_a, refresh = login(client)
+        access_b, _ = login(client)
+        assert asyncio.run(revocation_state()) == (0, 0)
+
+        # Logging out twice with the same refresh token revokes it once
+        for access in (access_a, access_b):
+            client.cookies.set('refresh_token', refresh)
+            response = client.post(
+                '/auth/logout', headers={'Authorization': f'Bearer {access}'}
+            )
+            assert response.status_code == 200
+            client.cookies.clear()
+        assert asyncio.run(revocation_state()) == (3, 0)
+
+        access_c, _ = login(client)
+        client.post(
+            '/auth/logout?global_logout=true',
+            headers={'Authorization': f'Bearer {access_c}'},
+        )
+        assert asyncio.run(revocation_state()) == (3, 1)
+        assert status_of(client, access_c) == 401
+
+
+def test_revocation_epochs_and_single_token_revocation(
+    make_app, login, status_of
+):
+    app, auth = make_app()
+    with TestClient(app) as client:
+        access_a, refresh_a = login(client)
+        access_b, _ = login(client)
+
+        # Logging out one session only revokes that session's tokens
+        client.cookies.set('refresh_token', refresh_a)
+        client.post(
+            '/auth/logout', headers={'Authorization': f'Bearer {access_a}'}
+        )
+        assert status_of(client, access_a) == 401
+        assert status_of(client, access_b) == 200
+        response = client.post('/auth/refresh', json=refresh_a)
+        assert response.status_code == 401
+
+        # A global logout revokes every earlier token, but not new logins
+        client.post(
+            '/auth/logout?global_logout=true',
+            headers={'Authorization': f'Bearer {access_b}'},
+        )
+        assert status_of(client, access_b) == 401
+        access_c, _ = login(client)
+        assert status_of(client, access_c) == 200
+        assert len(auth.revocations) == 3
+
+    # A restarted node loads the revocation state from the database
+    app, auth = make_app()
+    with TestClient(app) as client:
+        assert status_of(client, access_a) == 401
+        assert status_of(client, access_b) == 401
+        assert status_of(client, access_c) == 200
 
-    # Create user
-    user = User(email='test@example.com', is_revoked=False)
-    db.add(user)
-    db.commit()
 
-    token = create_access_token(data={'sub': user.email})
+def test_revocations_reach_other_workers_without_a_bus(
+    settings, make_app, login, status_of
+):
+    settings.STATELESS_AUTH_ENABLED = True
 
-    # Enable revocation for test
-    settings.AUTH_REVOCATION_ENABLED = True
+    # Two workers sharing one database, without an invalidation bus
+    with TestClient(make_app()[0]) as worker_a, TestClient(
+        make_app()[0]
+    ) as worker_b:
+        first, _ = login(worker_a)
+        second, _ = login(worker_a)
+        assert status_of(worker_b, first) == 200
 
-    # 1. Normal access
-    async def mock_get_current_user():
-        u = db.query(User).filter(User.email == 'test@example.com').first()
-        if settings.AUTH_REVOCATION_ENABLED and u.is_revoked:
-            raise HTTPException(status_code=403, detail='Revoked')
-        return u
+        worker_a.post(
+            '/auth/logout', headers={'Authorization': f'Bearer {first}'}
+        )
+        assert status_of(worker_b, first) == 401
+        assert status_of(worker_b, second) == 200
 
-    import asyncio
+        worker_a.post(
+            '/auth/logout?global_logout=true',
+            headers={'Authorization': f'Bearer {second}'},
+        )
+        assert status_of(worker_a, second) == 401
+        assert status_of(worker_b, second) == 401
 
-    current_u = asyncio.run(mock_get_current_user())
-    assert current_u.email == 'test@example.com'
 
-    # 2. Revoke globally (Logout all devices)
-    user.is_revoked = True
-    db.commit()
+def test_existing_users_table_gains_token_version(
+    tmp_path, make_app, login, status_of
+):
+    with TestClient(make_app()[0]):
+        pass
 
-    with pytest.raises(HTTPException) as exc:
-        asyncio.run(mock_get_current_user())
-    assert exc.value.status_code == 403
+    # A database created before users.token_version existed
+    connection = sqlite3.connect(tmp_path / 'revocation.db')
+    connection.execute('ALTER TABLE users DROP COLUMN token_version')
+    connection.commit()
+    connection.close()
 
-    db.close()
+    with TestClient(make_app()[0]) as client:
+        access, _ = login(client)
+        assert status_of(client, access) == 200
@@ -0,0 +1,114 @@
+import pytest
+
+from fastapi import FastAPI
+from sqlalchemy.ext.asyncio import (
+    create_async_engine,
+    async_sessionmaker,
+    AsyncSession,
+)
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.database.models import Base, User, Role, Permission
+from fastapi_oauth_rbac.rbac.invalidation import InMemoryInvalidationBackend
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.policy import PolicyCache
+from fastapi_oauth_rbac.rbac.shared import SharedPolicyStore
+
+
+@pytest.mark.asyncio
+async def test_workers_see_published_generations(tmp_path):
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    path = str(tmp_path / 'policy')
+
+    async with AsyncSessionLocal() as db:
+        read_p = Permission(name='docs:read')
+        role = Role(name='reader', permissions=[read_p])
+        user = User(email='reader@example.com', roles=[role])
+        db.add_all([read_p, role, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+
+        # Two stores on the same path stand in for two worker processes
+        writer = SharedPolicyStore(path)
+        reader = SharedPolicyStore(path)
+        assert reader.get_graph() is None
+
+        assert await writer.publish(db) == 1
+        # Publishing an unchanged policy writes nothing
+        assert await writer.publish(db) == 1
+
+        rbac = RBACManager(db, policy_cache=PolicyCache(shared=reader))
+        assert await rbac.get_user_permissions(user) == {'docs:read'}
+        graph = reader.get_graph()
+        assert reader.get_graph() is graph
+
+        role.permissions.append(Permission(name='docs:write'))
+        await db.commit()
+        assert await writer.publish(db) == 2
+        assert not (tmp_path / 'policy.1').exists()
+
+        rbac = RBACManager(db, policy_cache=PolicyCache(shared=reader))
+        assert await rbac.get_user_permissions(user) == {
+            'docs:read',
+            'docs:write',
+        }
+        assert reader.get_graph() is not graph
+
+        writer.close()
+        reader.close()
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_policy_events_republish_other_hosts_shared_policy(tmp_path):
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=engine, class_=AsyncSession, expire_on_commit=False
+    )
+    backend = InMemoryInvalidationBackend()
+
+    # Two nodes on different hosts, each with its own shared store
+    def node(name):
+        return FastAPIOAuthRBAC(
+            FastAPI(),
+            settings=Settings(
+                DATABASE_URL='sqlite+aiosqlite:///:memory:',
+                POLICY_SHARED_PATH=str(tmp_path / name),
+            ),
+            invalidation_backend=backend,
+        )
+
+    node_a, node_b = node('a'), node('b')
+
+    async with AsyncSessionLocal() as db:
+        role = Role(name='reader', permissions=[])
+        user = User(email='reader@example.com', roles=[role])
+        db.add_all([role, user])
+        await db.commit()
+        await db.refresh(user, ['roles'])
+        # Node B's host has published its own generation
+        await node_b.policy_changed(db)
+        await node_a.invalidation_bus.poll(db)
+
+        rbac_b = node_b.get_rbac_manager(db)
+        assert await rbac_b.get_user_permissions(user) == set()
+
+        role.permissions.append(Permission(name='docs:read'))
+        await db.commit()
+        await node_a.policy_changed(db, [role.id])
+        await node_b.invalidation_bus.poll(db)
+
+        rbac_b = node_b.get_rbac_manager(db)
+        assert await rbac_b.get_user_permissions(user) == {'docs:read'}
+
+    node_a.shared_policy.close()
+    node_b.shared_policy.close()
+    await engine.dispose()
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.rbac.dependencies import requires_permission
+from fastapi_oauth_rbac.rbac.policy import PolicyGraph
+from fastapi_oauth_rbac.rbac.snapshot import (
+    graph_from_snapshot,
+    read_policy_snapshot,
+)
+
+
+def _make_app(settings):
+    app = FastAPI()
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get('/reports', dependencies=[requires_permission('reports:read')])
+    async def reports():
+        return {'ok': True}
+
+    return app, auth
+
+
+def test_workers_start_from_policy_snapshot(tmp_path, monkeypatch):
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/snapshot.db',
+        ADMIN_PASSWORD='admin-password',
+    )
+    snapshot_path = str(tmp_path / 'policy.json')
+
+    app, auth = _make_app(settings)
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+
+        version = client.portal.call(auth.export_policy_snapshot, snapshot_path)
+
+        async def load_graph():
+            async with auth.db_sessionmaker() as session:
+                return await PolicyGraph.load(session)
+
+        graph = client.portal.call(load_graph)
+
+    snapshot = read_policy_snapshot(snapshot_path)
+    assert snapshot['version'] == version
+    restored = graph_from_snapshot(snapshot)
+    assert restored.role_names == graph.role_names
+    assert restored.permission_names == graph.permission_names
+
+    worker_settings = settings.model_copy(
+        update={'POLICY_SNAPSHOT_PATH': snapshot_path}
+    )
+    worker_app, worker_auth = _make_app(worker_settings)
+
+    async def no_setup(self, db):
+        raise AssertionError('setup_defaults ran despite a valid snapshot')
+
+    monkeypatch.setattr(FastAPIOAuthRBAC, 'setup_defaults', no_setup)
+    with TestClient(worker_app) as client:
+        response = client.get(
+            '/reports', headers={'Authorization': f'Bearer {token}'}
+        )
+        assert response.status_code == 200
+
+
+def test_tampered_snapshot_is_rejected(tmp_path):
+    snapshot = {
+        'format': 1,
+        'version': 'not-the-hash',
+        'roles': [[1, 'admin', None, None]],
+        'permissions': [[1, '*', None]],
+        'role_permissions': [[1, 1]],
+    }
+    with pytest.raises(ValueError):
+        graph_from_snapshot(json.loads(json.dumps(snapshot)))
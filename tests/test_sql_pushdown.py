@@ -0,0 +1,98 @@
+import pytest
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from fastapi_oauth_rbac.database.models import Base, User, Role, Permission
+from fastapi_oauth_rbac.rbac.logic import And, Not, Or, PermissionSet
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.principal import Principal, UserPrincipal
+from fastapi_oauth_rbac.rbac.sql import requirement_clause
+
+
+@pytest.mark.asyncio
+async def test_requirement_clause_matches_python_resolution():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    AsyncSessionLocal = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async with AsyncSessionLocal() as db:
+        read_p = Permission(name='docs:read')
+        write_p = Permission(name='docs:write', children=[read_p])
+        audit_p = Permission(name='audit:read')
+        wildcard_p = Permission(name='audit:*')
+        db.add_all([read_p, write_p, audit_p, wildcard_p])
+
+        reader = Role(name='reader', permissions=[read_p])
+        editor = Role(name='editor', parent=reader, permissions=[write_p])
+        auditor = Role(name='auditor', permissions=[wildcard_p])
+        # Tenant role inheriting from a global one: only for tenant 'acme'
+        acme_staff = Role(name='acme_staff', parent=auditor, tenant_id='acme')
+        users = [
+            User(email='reader@example.com', roles=[reader]),
+            User(email='editor@example.com', roles=[editor]),
+            User(email='staff@acme.com', tenant_id='acme', roles=[acme_staff]),
+            User(
+                email='staff@other.com', tenant_id='other', roles=[acme_staff]
+            ),
+            User(email='nobody@example.com'),
+        ]
+        db.add_all([reader, editor, auditor, acme_staff, *users])
+        await db.commit()
+        for user in users:
+            await db.refresh(user, ['roles'])
+
+        requirements = [
+            'docs:read',
+            'docs:write',
+            'audit:read',
+            And('docs:read', Not('docs:write')),
+            Or('audit:read', 'docs:write'),
+        ]
+        rbac = RBACManager(db)
+        for requirement in requirements:
+            expected = set()
+            for user in users:
+                permissions = await rbac.get_user_permissions(user)
+                if Or(requirement).evaluate(permissions):
+                    expected.add(user.email)
+
+            # Correlated: one predicate filters the whole users table
+            result = await db.execute(
+                select(User.email).where(
+                    requirement_clause(requirement, User.id, User.tenant_id)
+                )
+            )
+            assert set(result.scalars().all()) == expected, requirement
+
+            # Bound to a concrete user
+            for user in users:
+                result = await db.execute(
+                    select(func.count())
+                    .select_from(User)
+                    .where(requirement_clause(requirement, user))
+                )
+                allowed = result.scalar_one() > 0
+                assert allowed == (user.email in expected), (requirement, user)
+
+                # The cached principal `get_current_user` may return
+                cached = await UserPrincipal.load(db, User, User.id == user.id)
+                result = await db.execute(
+                    select(func.count())
+                    .select_from(User)
+                    .where(requirement_clause(requirement, cached))
+                )
+                assert (result.scalar_one() > 0) == allowed, (requirement, user)
+
+        principal = Principal('p@example.com', PermissionSet({'docs:*'}), {})
+        result = await db.execute(
+            select(func.count())
+            .select_from(User)
+            .where(requirement_clause('docs:write', principal))
+        )
+        assert result.scalar_one() == len(users)
@@ -0,0 +1,205 @@
+import asyncio
+
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from fastapi_oauth_rbac import (
+    AuditLog,
+    FastAPIOAuthRBAC,
+    Settings,
+    get_current_db_user,
+    get_current_user,
+)
+from fastapi_oauth_rbac.core.security import (
+    create_access_token,
+    decode_token,
+)
+from fastapi_oauth_rbac.rbac.dependencies import get_db, requires_permission
+from fastapi_oauth_rbac.rbac.manager import RBACManager
+from fastapi_oauth_rbac.rbac.principal import Principal
+
+
+def test_stateless_mode_authorizes_from_token_scopes(tmp_path, monkeypatch):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/stateless.db',
+        ADMIN_PASSWORD='admin-password',
+        STATELESS_AUTH_ENABLED=True,
+        AUTH_REVOCATION_ENABLED=True,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get('/reports', dependencies=[requires_permission('reports:read')])
+    async def reports(user=Depends(get_current_user)):
+        return {'email': user.email, 'stateless': isinstance(user, Principal)}
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        async def no_resolution(self, user):
+            raise AssertionError('permissions resolved from the database')
+
+        monkeypatch.setattr(RBACManager, '_resolve_permissions', no_resolution)
+
+        response = client.get('/reports', headers=headers)
+        assert response.status_code == 200
+        assert response.json() == {
+            'email': settings.ADMIN_EMAIL,
+            'stateless': True,
+        }
+
+        # Refresh tokens carry no scopes and are rejected
+        refresh = client.cookies.get('refresh_token')
+        response = client.get(
+            '/reports', headers={'Authorization': f'Bearer {refresh}'}
+        )
+        assert response.status_code == 401
+
+        # A global logout revokes the stateless token as well
+        client.post('/auth/logout?global_logout=true', headers=headers)
+        response = client.get('/reports', headers=headers)
+        assert response.status_code == 401
+
+
+def test_compact_scopes_fall_back_to_db_when_policy_changes(
+    tmp_path, monkeypatch
+):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/compact.db',
+        ADMIN_PASSWORD='admin-password',
+        STATELESS_AUTH_ENABLED=True,
+        COMPACT_TOKEN_SCOPES=True,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get('/reports', dependencies=[requires_permission('reports:read')])
+    async def reports(user=Depends(get_current_user)):
+        return {'stateless': isinstance(user, Principal)}
+
+    resolutions = []
+    original = RBACManager._resolve_permissions
+
+    async def counting_resolve(self, user):
+        resolutions.append(user.email)
+        return await original(self, user)
+
+    monkeypatch.setattr(RBACManager, '_resolve_permissions', counting_resolve)
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        payload = decode_token(token, settings=settings)
+        assert payload['scopes'] == ['*']
+        assert payload['pv'] == auth.policy_version
+
+        resolutions.clear()
+        response = client.get('/reports', headers=headers)
+        assert response.json() == {'stateless': True}
+        assert resolutions == []
+
+        # After a policy change the token's scopes are no longer trusted
+        auth.invalidate_policy()
+        response = client.get('/reports', headers=headers)
+        assert response.json() == {'stateless': False}
+        assert resolutions == [settings.ADMIN_EMAIL]
+
+
+def test_stateless_dashboard_actions_audit_the_token_subject(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/stateless_audit.db',
+        ADMIN_PASSWORD='admin-password',
+        STATELESS_AUTH_ENABLED=True,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+    auth.include_dashboard()
+
+    async def actors():
+        async with auth.db_sessionmaker() as session:
+            result = await session.execute(
+                select(AuditLog.actor_email).where(
+                    AuditLog.action == 'USER_CREATED_DASHBOARD'
+                )
+            )
+            return result.scalars().all()
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+        response = client.post(
+            '/auth/dashboard/user/create',
+            data={'email': 'new@example.com', 'password': 'new-password'},
+            headers={'Authorization': f'Bearer {token}'},
+            follow_redirects=False,
+        )
+        assert response.status_code == 303
+
+    assert asyncio.run(actors()) == [settings.ADMIN_EMAIL]
+
+
+def test_stateless_role_checks_and_malformed_uid(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/stateless_roles.db',
+        ADMIN_PASSWORD='admin-password',
+        STATELESS_AUTH_ENABLED=True,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    @app.get('/roles')
+    async def roles(user=Depends(get_current_user), db=Depends(get_db)):
+        rbac = auth.get_rbac_manager(db)
+        return {
+            'stateless': isinstance(user, Principal),
+            'admin': await rbac.has_role(user, 'admin'),
+            'any': await rbac.has_any_role(user, ['user', 'admin']),
+            'all': await rbac.has_all_roles(user, ['admin', 'nobody']),
+        }
+
+    @app.get('/profile')
+    async def profile(user=Depends(get_current_db_user)):
+        return {'email': user.email}
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        headers = {
+            'Authorization': f'Bearer {response.json()["access_token"]}'
+        }
+        response = client.get('/roles', headers=headers)
+        assert response.json() == {
+            'stateless': True,
+            'admin': True,
+            'any': True,
+            'all': False,
+        }
+
+        token = create_access_token(
+            {'sub': settings.ADMIN_EMAIL, 'uid': 'not-a-uuid', 'scopes': []},
+            settings=settings,
+        )
+        response = client.get(
+            '/profile', headers={'Authorization': f'Bearer {token}'}
+        )
+        assert response.status_code == 401
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from fastapi_oauth_rbac import AuditLog, FastAPIOAuthRBAC, Settings
+from fastapi_oauth_rbac.auth.throttle import (
+    InMemoryThrottleBackend,
+    LoginThrottle,
+)
+from fastapi_oauth_rbac.core.security import password_pool
+
+
+def test_login_throttle_locks_out_without_hashing(tmp_path, monkeypatch):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/throttle.db',
+        ADMIN_PASSWORD='admin-password',
+        LOGIN_THROTTLE_ENABLED=True,
+        LOGIN_THROTTLE_IDENTITY_LIMIT=3,
+        LOGIN_THROTTLE_IP_LIMIT=6,
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    def login(username, password='wrong'):
+        return client.post(
+            '/auth/login', data={'username': username, 'password': password}
+        )
+
+    async def lockouts():
+        async with auth.db_sessionmaker() as session:
+            result = await session.execute(
+                select(AuditLog.action, AuditLog.target).where(
+                    AuditLog.action.like('%_LOCKOUT')
+                )
+            )
+            return result.all()
+
+    with TestClient(app) as client:
+        assert login(settings.ADMIN_EMAIL, 'admin-password').status_code == 200
+        for _ in range(3):
+            assert login(settings.ADMIN_EMAIL).status_code == 401
+
+        hashes = []
+        original = password_pool.run
+
+        async def counting_run(fn, *args):
+            hashes.append(fn)
+            return await original(fn, *args)
+
+        monkeypatch.setattr(password_pool, 'run', counting_run)
+
+        # Locked even with the right password, and no hash was verified
+        response = login(settings.ADMIN_EMAIL, 'admin-password')
+        assert response.status_code == 429
+        assert 0 < int(response.headers['Retry-After']) <= 900
+        assert hashes == []
+
+        # Other identities are limited per IP: 4 attempts so far
+        assert login('other@example.com').status_code == 401
+        assert login('other@example.com').status_code == 401
+        assert login('third@example.com').status_code == 429
+
+        assert asyncio.run(lockouts()) == [
+            ('LOGIN_LOCKOUT', f'login:id:{settings.ADMIN_EMAIL}'),
+            ('LOGIN_LOCKOUT', 'login:ip:testclient'),
+        ]
+
+        for _ in range(3):
+            client.post('/auth/forgot-password?email=new@example.com')
+        response = client.post('/auth/forgot-password?email=new@example.com')
+        assert response.status_code == 429
+
+
+def test_login_throttle_uses_the_client_ip_resolver(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/proxy.db',
+        LOGIN_THROTTLE_ENABLED=True,
+        LOGIN_THROTTLE_IP_LIMIT=2,
+    )
+    # Behind a trusted proxy every request comes from the proxy's address
+    auth = FastAPIOAuthRBAC(
+        app,
+        settings=settings,
+        client_ip_resolver=lambda request: request.headers.get(
+            'X-Forwarded-For'
+        ),
+    )
+    auth.include_auth_router()
+
+    def login(username, client_ip):
+        return client.post(
+            '/auth/login',
+            data={'username': username, 'password': 'wrong'},
+            headers={'X-Forwarded-For': client_ip},
+        ).status_code
+
+    with TestClient(app) as client:
+        assert login('a@example.com', '10.0.0.1') == 401
+        assert login('b@example.com', '10.0.0.1') == 401
+        assert login('c@example.com', '10.0.0.1') == 429
+        # Other clients behind the same proxy are unaffected
+        assert login('c@example.com', '10.0.0.2') == 401
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_counters(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(
+        'fastapi_oauth_rbac.auth.throttle.time.time', lambda: now[0]
+    )
+    backend = InMemoryThrottleBackend(window=100, max_keys=2)
+
+    for _ in range(4):
+        await backend.add('a')
+    assert await backend.retry_after('a', 5) == 0
+    assert await backend.retry_after('a', 4) == 100
+
+    # Half a window later, half of the previous bucket still counts
+    now[0] += 150
+    assert await backend.add('a') == 3
+    assert await backend.retry_after('a', 2) == 25
+    now[0] += 26
+    assert await backend.retry_after('a', 2) == 0
+
+    # Bounded: the least recently used key is evicted
+    await backend.add('b')
+    await backend.add('c')
+    assert len(backend) == 2 and await backend.retry_after('a', 1) == 0
+
+    # Counters outside the window are dropped
+    now[0] += 300
+    assert await backend.retry_after('b', 1) == 0
+    assert len(backend) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_attempts_cannot_overshoot_the_limit():
+    throttle = LoginThrottle(InMemoryThrottleBackend(), identity_limit=2)
+
+    # Both pass the check before either is counted
+    assert await throttle.check('login', 'a@example.com', None) == 0
+    assert await throttle.check('login', 'a@example.com', None) == 0
+    assert await throttle.hit('login', 'a@example.com', None) == (True, [])
+    assert await throttle.hit('login', 'a@example.com', None) == (
+        True,
+        ['login:id:a@example.com'],
+    )
+    assert await throttle.hit('login', 'a@example.com', None) == (False, [])
+
+    for limits in ({'identity_limit': 0}, {'ip_limit': 0}):
+        with pytest.raises(ValueError):
+            LoginThrottle(InMemoryThrottleBackend(), **limits)
+    with pytest.raises(ValueError):
+        InMemoryThrottleBackend(window=0)
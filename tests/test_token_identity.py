@@ -0,0 +1,55 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from fastapi_oauth_rbac import FastAPIOAuthRBAC, Settings, User
+from fastapi_oauth_rbac.core.security import create_access_token, decode_token
+
+
+def test_tokens_resolve_users_by_id_after_email_change(tmp_path):
+    app = FastAPI()
+    settings = Settings(
+        DATABASE_URL=f'sqlite+aiosqlite:///{tmp_path}/identity.db',
+        ADMIN_PASSWORD='admin-password',
+    )
+    auth = FastAPIOAuthRBAC(app, settings=settings)
+    auth.include_auth_router()
+
+    async def change_email(email):
+        async with auth.db_sessionmaker() as session:
+            await session.execute(
+                update(User)
+                .where(User.email == settings.ADMIN_EMAIL)
+                .values(email=email)
+            )
+            await session.commit()
+
+    with TestClient(app) as client:
+        response = client.post(
+            '/auth/login',
+            data={'username': settings.ADMIN_EMAIL, 'password': 'admin-password'},
+        )
+        token = response.json()['access_token']
+        payload = decode_token(token, settings=settings)
+        assert payload['sub'] == settings.ADMIN_EMAIL
+        assert payload['uid']
+
+        # Tokens issued before `uid` existed still resolve by email
+        legacy = create_access_token(
+            {'sub': settings.ADMIN_EMAIL}, settings=settings
+        )
+        response = client.get(
+            '/auth/me', headers={'Authorization': f'Bearer {legacy}'}
+        )
+        assert response.status_code == 200
+
+        asyncio.run(change_email('renamed@example.com'))
+
+        response = client.get(
+            '/auth/me', headers={'Authorization': f'Bearer {token}'}
+        )
+        assert response.json()['email'] == 'renamed@example.com'
+        response = client.post('/auth/refresh')
+        assert response.status_code == 200